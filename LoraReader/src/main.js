@@ -1,6 +1,6 @@
 import { createApp } from 'vue'
 import App from './App.vue'
-import { updateLoraData, initializeAllLoras, initGlobalState, globalState } from './utils/globalVar'
+import { updateLoraData, initializeAllLoras, initGlobalState, globalState, connectLibraryEvents } from './utils/globalVar'
 
 const app = createApp(App)
 
@@ -10,8 +10,9 @@ async function initializeApplication() {
         // 初始化全局状态
         initGlobalState()
         
-        // 初始化全局 LoRA 数据
+        // 初始化全局 LoRA 数据，之后通过事件流增量更新
         await initializeAllLoras()
+        connectLibraryEvents()
         
         // 初始化当前页面数据
         const response = await fetch('http://localhost:5000/lora-files?path=/')
@@ -8,6 +8,9 @@ export const loraNameMap = ref(new Map())
 export const allLoraMap = ref(new Map())
 export const allLoraNameMap = ref(new Map())
 
+// allLoraMap 已同步到的库版本 { epoch, version }，用于 /lora-files/changes 增量同步
+let libraryVersion = null
+
 // 更新当前页面的 LoRA 数据
 export function updateLoraData(loraFiles) {
     globalLoraMap.value.clear()
@@ -22,25 +25,130 @@ export function updateLoraData(loraFiles) {
     })
 }
 
+// 添加一个 LoRA 到全局映射
+function addToAllLoraMap(lora) {
+    allLoraMap.value.set(lora.name, lora)
+    const baseName = lora.name.replace('.safetensors', '')
+    const mainName = baseName.replace(/-\d+$/, '')
+    allLoraNameMap.value.set(baseName, lora)
+    allLoraNameMap.value.set(mainName, lora)
+}
+
+// 从全局映射中移除一个 LoRA（同名文件在其他目录时保留）
+function removeFromAllLoraMap(name, relativePath) {
+    const lora = allLoraMap.value.get(name)
+    if (!lora || lora.relative_path !== relativePath) return
+    allLoraMap.value.delete(name)
+    for (const [key, value] of allLoraNameMap.value.entries()) {
+        if (value === lora) allLoraNameMap.value.delete(key)
+    }
+}
+
+// 服务器推送的事件类型，见后端 /events
+const LIBRARY_EVENT_TYPES = [
+    'lora_added', 'lora_updated', 'lora_removed', 'preview_added', 'preview_swapped',
+    'clicks_changed', 'combination_created', 'combination_deleted',
+    'combination_preview_added', 'combination_preview_deleted',
+    'config_changed', 'library_reloaded', 'resync'
+]
+
+const libraryEventListeners = new Set()
+let libraryEventSource = null
+
+// 根据推送的增量更新全局映射
+function applyLibraryEvent(type, data) {
+    if (type === 'lora_added' || type === 'lora_updated' || type === 'lora_removed') {
+        // 事件来自另一次完整加载（例如服务重启）时，增量无法直接套用
+        if (!libraryVersion || data.epoch !== libraryVersion.epoch) {
+            syncAllLoras()
+            return
+        }
+        if (type === 'lora_removed') {
+            data.loras.forEach(lora => removeFromAllLoraMap(lora.name, lora.relative_path))
+        } else {
+            data.loras.forEach(addToAllLoraMap)
+        }
+        libraryVersion.version = Math.max(libraryVersion.version, data.version)
+    } else if (type === 'clicks_changed') {
+        const lora = allLoraMap.value.get(data.name)
+        if (lora) lora.global_clicks = data.global_clicks
+        const pageLora = globalLoraMap.value.get(data.name)
+        if (pageLora) pageLora.global_clicks = data.global_clicks
+    } else if (type === 'resync') {
+        // 错过了部分事件，按版本号补齐
+        syncAllLoras()
+    } else if (type === 'library_reloaded' || (type === 'config_changed' && data.lora_path_changed)) {
+        // 无法增量更新时重新加载完整列表
+        initializeAllLoras()
+    }
+}
+
+// 订阅库变化事件，返回取消订阅的函数；listener(type, data)
+export function onLibraryEvent(listener) {
+    libraryEventListeners.add(listener)
+    return () => libraryEventListeners.delete(listener)
+}
+
+// 连接后端的 SSE 事件流，断线后浏览器会自动重连并补发错过的事件
+export function connectLibraryEvents() {
+    if (libraryEventSource) return libraryEventSource
+    libraryEventSource = new EventSource('http://localhost:5000/events')
+    for (const type of LIBRARY_EVENT_TYPES) {
+        libraryEventSource.addEventListener(type, (event) => {
+            const data = JSON.parse(event.data)
+            applyLibraryEvent(type, data)
+            libraryEventListeners.forEach(listener => listener(type, data))
+        })
+    }
+    return libraryEventSource
+}
+
+// 以 NDJSON 流的方式读取全部 LoRA，每解析出一条就回调一次，返回最后一行中的库版本
+export async function streamAllLoras(onLora) {
+    const response = await fetch('http://localhost:5000/scan-all-loras?stream=1')
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`)
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    let summary = null
+
+    const handleLine = (line) => {
+        if (!line.trim()) return
+        const lora = JSON.parse(line)
+        if (lora.error) {
+            throw new Error(lora.error)
+        }
+        if (lora.done) {
+            summary = lora
+            return
+        }
+        onLora(lora)
+    }
+
+    while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const lines = buffer.split('\n')
+        buffer = lines.pop()
+        lines.forEach(handleLine)
+    }
+    handleLine(buffer + decoder.decode())
+    return summary
+}
+
 // 初始化全局 LoRA 数据
 export async function initializeAllLoras() {
     try {
-        const response = await fetch('http://localhost:5000/scan-all-loras')
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`)
-        }
-        const data = await response.json()
-        
         allLoraMap.value.clear()
         allLoraNameMap.value.clear()
 
-        data.lora_files.forEach(lora => {
-            allLoraMap.value.set(lora.name, lora)
-            const baseName = lora.name.replace('.safetensors', '')
-            const mainName = baseName.replace(/-\d+$/, '')
-            allLoraNameMap.value.set(baseName, lora)
-            allLoraNameMap.value.set(mainName, lora)
-        })
+        // 流式读取，首批结果到达后即可使用
+        const summary = await streamAllLoras(addToAllLoraMap)
+        libraryVersion = summary ? { epoch: summary.epoch, version: summary.version } : null
         
         console.log(`Initialized ${allLoraMap.value.size} global LoRAs`)
         return true
@@ -50,6 +158,33 @@ export async function initializeAllLoras() {
     }
 }
 
+// 只拉取上次同步之后的变化，服务端要求完整同步时重新加载全部数据
+export async function syncAllLoras() {
+    if (!libraryVersion) {
+        return initializeAllLoras()
+    }
+    try {
+        const params = new URLSearchParams({ since: libraryVersion.version, epoch: libraryVersion.epoch })
+        const response = await fetch(`http://localhost:5000/lora-files/changes?${params}`)
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`)
+        }
+        const data = await response.json()
+        if (data.full_resync) {
+            return initializeAllLoras()
+        }
+        data.added.forEach(addToAllLoraMap)
+        data.updated.forEach(addToAllLoraMap)
+        data.removed.forEach(lora => removeFromAllLoraMap(lora.name, lora.relative_path))
+        libraryVersion = { epoch: data.epoch, version: data.version }
+        console.log(`Synced LoRAs: +${data.added.length} ~${data.updated.length} -${data.removed.length}`)
+        return true
+    } catch (err) {
+        console.error('Error syncing LoRAs:', err)
+        return false
+    }
+}
+
 // 修改查找函数使用全局映射
 export function findLoraByName(name) {
     console.log('Finding LoRA by name:', name)
@@ -82,6 +217,84 @@ export function findLoraByName(name) {
     return null
 }
 
+// 通过后端搜索索引查找 LoRA，请求失败时退回本地搜索
+export async function searchLoras(searchTerm, limit = 200) {
+    try {
+        const params = new URLSearchParams({ q: searchTerm, limit })
+        const response = await fetch(`http://localhost:5000/search?${params}`)
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`)
+        }
+        const data = await response.json()
+        return data.results.map(lora => ({ ...lora, searchTerm: data.search_term }))
+    } catch (err) {
+        console.error('Error searching LoRAs:', err)
+        return findLorasByName(searchTerm)
+    }
+}
+
+// 按哈希（WebUI Lora hashes / AutoV2 / SHA-256）精确查找 LoRA，未找到或请求失败时返回空数组
+export async function findLorasByHash(hash) {
+    try {
+        const params = new URLSearchParams({ hash })
+        const response = await fetch(`http://localhost:5000/lora-by-hash?${params}`)
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`)
+        }
+        const data = await response.json()
+        return Object.values(data.results)[0] || []
+    } catch (err) {
+        console.error('Error finding LoRA by hash:', err)
+        return []
+    }
+}
+
+// 一次请求查找多个 LoRA，items 为 { path } / { hash, name } / { name }，
+// 返回与 items 顺序一致的匹配列表（未找到时为空数组），请求失败时返回 null
+export async function fetchLoraBatch(items, { previews = true } = {}) {
+    if (!items.length) return []
+    try {
+        const response = await fetch('http://localhost:5000/lora-batch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ items, previews })
+        })
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`)
+        }
+        const data = await response.json()
+        return data.results.map(result => result.loras)
+    } catch (err) {
+        console.error('Error fetching LoRA batch:', err)
+        return null
+    }
+}
+
+// 由后端解析预览图中的生成参数，只支持后端提供的预览图，其他图片返回 null
+export async function fetchImageMetadata(imageUrl) {
+    try {
+        const url = new URL(imageUrl, window.location.href)
+        const params = new URLSearchParams()
+        if (url.pathname === '/preview') {
+            params.set('path', url.searchParams.get('path') || '')
+            params.set('file', url.searchParams.get('file') || '')
+        } else {
+            const match = url.pathname.match(/^\/combination-preview\/([^/]+)\/([^/]+)$/)
+            if (!match) return null
+            params.set('combo_id', decodeURIComponent(match[1]))
+            params.set('file', decodeURIComponent(match[2]))
+        }
+        const response = await fetch(`http://localhost:5000/image-metadata?${params}`)
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`)
+        }
+        return await response.json()
+    } catch (err) {
+        console.error('Error fetching image metadata:', err)
+        return null
+    }
+}
+
 export function getAllLoras() {
     return Array.from(globalLoraMap.value.values())
 }
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'base_model_rules.json')
+
+# 评分信号来源：训练注释、底模文件名、路径各级目录、LoRA 文件名
+SIGNAL_SOURCES = ('training_comment', 'sd_model_name', 'path_components', 'file_name')
+
+
+def _condition_pattern(condition):
+    """把 contains/startswith/endswith/regex 条件编译成一个正则分支（任一满足即匹配）"""
+    parts = [re.escape(text) for text in condition.get('contains', [])]
+    parts += ['^' + re.escape(text) for text in condition.get('startswith', [])]
+    parts += [re.escape(text) + r'\Z' for text in condition.get('endswith', [])]
+    parts += condition.get('regex', [])
+    if not parts:
+        raise ValueError(f'Empty base model rule condition: {condition}')
+    return '|'.join(f'(?:{part})' for part in parts)
+
+
+class _ScoringSignal:
+    """一个评分信号：所有规则按优先级合并成一个前瞻正则，一次扫描即可得到命中的最高优先级规则"""
+
+    def __init__(self, spec):
+        self.source = spec['source']
+        if self.source not in SIGNAL_SOURCES:
+            raise ValueError(f'Unknown base model signal source: {self.source}')
+        self.weight = spec['weight']
+        self.unless_scored = tuple(spec.get('unless_scored', []))
+        self.models = [rule['model'] for rule in spec['rules']]
+        # 零宽前瞻让每个位置都参与匹配，等价于逐条做子串包含判断
+        branches = '|'.join(f'(?P<r{i}>{_condition_pattern(rule)})' for i, rule in enumerate(spec['rules']))
+        self.pattern = re.compile(f'(?=(?:{branches}))')
+
+    def match(self, text):
+        """返回命中的优先级最高的底模名称，未命中返回 None"""
+        best = None
+        for m in self.pattern.finditer(text):
+            index = int(m.lastgroup[1:])
+            if best is None or index < best:
+                best = index
+                if best == 0:
+                    break
+        return None if best is None else self.models[best]
+
+
+class _RuleCascade:
+    """按顺序匹配的规则表，第一条所有条件都满足的规则生效"""
+
+    def __init__(self, rules):
+        conditions = []
+        index_of = {}
+        self.rules = []
+        for rule in rules:
+            indexes = []
+            for condition in rule['all_of']:
+                key = json.dumps(condition, sort_keys=True)
+                if key not in index_of:
+                    index_of[key] = len(conditions)
+                    conditions.append(condition)
+                indexes.append(index_of[key])
+            self.rules.append((rule['model'], tuple(indexes)))
+        # 每个条件一个可选前瞻，扫描一遍即可得到所有满足的条件
+        lookaheads = ''.join(f'(?=(?P<c{i}>{_condition_pattern(c)}))?' for i, c in enumerate(conditions))
+        self.pattern = re.compile(lookaheads)
+        self.condition_count = len(conditions)
+
+    def match(self, text):
+        satisfied = set()
+        for m in self.pattern.finditer(text):
+            satisfied.update(int(name[1:]) for name, value in m.groupdict().items() if value is not None)
+            if len(satisfied) == self.condition_count:
+                break
+        for model, indexes in self.rules:
+            if all(i in satisfied for i in indexes):
+                return model
+        return None
+
+
+class BaseModelClassifier:
+    """基于规则表的底模识别
+
+    规则从 JSON 文件加载并预编译，新增底模只需修改规则文件。
+    fingerprint 随规则内容变化，用于让元数据缓存在规则更新后失效。
+    """
+
+    def __init__(self, rules):
+        self.signals = [_ScoringSignal(spec) for spec in rules.get('scoring', [])]
+        self.name_rules = _RuleCascade(rules.get('name_rules', []))
+        self.comment_rules = _RuleCascade(rules.get('comment_rules', []))
+        self.fingerprint = hashlib.sha1(
+            json.dumps(rules, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_RULES_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def _signal_texts(self, source, metadata, file_path):
+        if source == 'training_comment':
+            return [metadata['ss_training_comment'].lower()] if 'ss_training_comment' in metadata else []
+        if source == 'sd_model_name':
+            return [metadata['ss_sd_model_name'].lower()] if 'ss_sd_model_name' in metadata else []
+        if source == 'path_components':
+            return file_path.lower().split(os.sep)
+        return [os.path.basename(file_path).lower()]
+
+    def score(self, metadata, file_path):
+        """按规则表为各个底模打分，返回 {底模: 分数}，顺序与首次得分顺序一致"""
+        model_scores = {}
+        for signal in self.signals:
+            if any(model_scores.get(model, 0) > 0 for model in signal.unless_scored):
+                continue
+            for text in self._signal_texts(signal.source, metadata, file_path):
+                model = signal.match(text)
+                if model is not None:
+                    model_scores[model] = model_scores.get(model, 0) + signal.weight
+        return model_scores
+
+    def classify(self, metadata, file_path):
+        """返回 (底模, 附加模型信息列表, 各底模得分)"""
+        model_scores = self.score(metadata, file_path)
+        base_model = None
+        model_info = []
+
+        base_version = metadata.get('ss_base_model_version')
+        if base_version:
+            if 'sdxl_base_v1-0' in base_version.lower():
+                # 如果有其他特征得分，使用得分最高的
+                if model_scores:
+                    base_model = max(model_scores.items(), key=lambda x: x[1])[0]
+                else:
+                    base_model = 'SDXL-Base'
+            model_info.append(base_version)
+
+        # 如果没有通过 ss_base_model_version 确定，使用得分最高的
+        if not base_model:
+            base_model = max(model_scores.items(), key=lambda x: x[1])[0] if model_scores else 'Unknown'
+
+        return base_model, model_info, model_scores
+
+    def from_name(self, model_name):
+        """从模型文件名判断底模，无法判断时返回 None"""
+        return self.name_rules.match(model_name.lower())
+
+    def from_comment(self, comment):
+        """从训练注释判断底模，无法判断时返回 None"""
+        if not comment:
+            return None
+        return self.comment_rules.match(comment.lower())
@@ -0,0 +1,375 @@
+"""LoraReader 后端基准测试
+
+生成合成的 LoRA 目录（子文件夹、带真实格式头部的 .safetensors、预览图、
+配置文件和较大的 clicks.json），通过 Flask test client 调用各接口，
+统计每个接口的吞吐量、p50/p99 延迟和进程的峰值内存，并把结果保存为 JSON，
+便于不同版本之间对比。
+
+峰值内存是整个进程到目前为止的最高值（ru_maxrss 只增不减），各接口的数值
+是按测量顺序累计的高水位，不是单个接口的内存占用。
+
+用法：
+    python benchmark.py --folders 20 --loras-per-folder 50 --output before.json
+    python benchmark.py --folders 20 --loras-per-folder 50 --baseline before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，此时不统计峰值内存
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+BASE_MODEL_VERSIONS = ['sdxl_base_v1-0', 'sd_v1', 'sd_v2']
+SD_MODEL_NAMES = ['ponyDiffusionV6XL.safetensors', 'illustriousXL_v01.safetensors',
+                  'animagineXL_v3.safetensors', 'v1-5-pruned.safetensors']
+NETWORK_MODULES = ['networks.lora', 'lycoris.kohya', 'networks.dylora']
+FOLDER_NAMES = ['characters', 'styles', 'pony', 'illustrious', 'concepts', 'poses', 'clothing', 'backgrounds']
+NAME_WORDS = ['anime', 'girl', 'style', 'pony', 'illu', 'xl', 'detail', 'light', 'dark', 'cyber',
+              'flower', 'armor', 'mecha', 'pastel', 'ink', 'sketch', 'il', 'v2', 'v3']
+SEARCH_TERMS = ['anime', 'style', 'pony', 'girl', 'xl', 'armor']
+TAG_WORDS = ['1girl', 'solo', 'long hair', 'smile', 'looking at viewer', 'blue eyes', 'outdoors', 'armor',
+             'flower', 'sky', 'dress', 'short hair', 'holding', 'simple background', 'upper body']
+
+
+# /scan-all-loras 输出格式的对比组合：(名称, 查询参数)
+WIRE_FORMATS = [
+    ('json', {}),
+    ('compact', {'compact': 1}),
+    ('columns', {'compact': 1, 'layout': 'columns'}),
+    ('fields', {'fields': 'name,relative_path,preview_path,metadata.base_model,metadata.modified_time,global_clicks',
+                'compact': 1, 'layout': 'columns'}),
+    ('msgpack', {'compact': 1, 'layout': 'columns', 'format': 'msgpack'}),
+]
+
+
+def _png_bytes(width=64, height=64):
+    """生成一张纯色 PNG，不依赖 Pillow"""
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body) & 0xffffffff)
+
+    row = b'\x00' + b'\x80\x40\xc0' * width
+    raw = row * height
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw))
+            + chunk(b'IEND', b''))
+
+
+def _safetensors_bytes(rng, tensors):
+    """生成结构与真实 LoRA 一致的 safetensors 文件：完整的 JSON 头部加极小的张量数据"""
+    dim = rng.choice([4, 8, 16, 32, 64])
+    metadata = {
+        'ss_base_model_version': rng.choice(BASE_MODEL_VERSIONS),
+        'ss_sd_model_name': rng.choice(SD_MODEL_NAMES),
+        'ss_network_module': rng.choice(NETWORK_MODULES),
+        'ss_network_dim': str(dim),
+        'ss_network_alpha': str(dim // 2),
+        'ss_training_comment': rng.choice(['', 'trained on pony', 'illustrious base', 'none']),
+        'ss_num_train_images': str(rng.randint(20, 2000)),
+        'ss_learning_rate': '0.0001',
+        'ss_tag_frequency': json.dumps({
+            f'{rng.randint(1, 20)}_dataset': {rng.choice(TAG_WORDS): rng.randint(1, 300) for _ in range(40)}
+        }),
+        'ss_dataset_dirs': json.dumps({
+            f'{rng.randint(1, 20)}_dataset': {'n_repeats': rng.randint(1, 20), 'img_count': rng.randint(10, 300)}
+        }),
+    }
+    header = {'__metadata__': metadata}
+    offset = 0
+    for i in range(tensors):
+        header[f'lora_unet_down_blocks_{i // 6}_attentions_{i % 6}.lora_down.weight'] = {
+            'dtype': 'F16', 'shape': [1, 1], 'data_offsets': [offset, offset + 2]}
+        offset += 2
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes += b' ' * (-len(header_bytes) % 8)
+    return struct.pack('<Q', len(header_bytes)) + header_bytes + b'\x00' * offset
+
+
+def generate_library(root, folders=10, loras_per_folder=50, depth=2, preview_ratio=0.8,
+                     config_ratio=0.5, tensors=200, clicks=5000, seed=0):
+    """在 root 下生成合成的 LoRA 库，返回 (LoRA 目录, LoRA 名称列表, clicks.json 路径)"""
+    rng = random.Random(seed)
+    png = _png_bytes()
+    names = []
+    lora_dir = os.path.join(root, 'loras')
+
+    for folder_index in range(folders):
+        parts = [f'{rng.choice(FOLDER_NAMES)}_{folder_index}']
+        for level in range(1, depth):
+            if rng.random() < 0.5:
+                parts.append(f'{rng.choice(FOLDER_NAMES)}_{folder_index}_{level}')
+        directory = os.path.join(lora_dir, *parts)
+        os.makedirs(directory, exist_ok=True)
+
+        for i in range(loras_per_folder):
+            stem = '_'.join(rng.sample(NAME_WORDS, 3)) + f'_{folder_index}_{i}'
+            name = f'{stem}.safetensors'
+            names.append(name)
+            with open(os.path.join(directory, name), 'wb') as f:
+                f.write(_safetensors_bytes(rng, tensors))
+            if rng.random() < preview_ratio:
+                with open(os.path.join(directory, f'{stem}.png'), 'wb') as f:
+                    f.write(png)
+                # 部分 LoRA 有多张预览图
+                for extra in range(rng.choice([0, 0, 1, 2])):
+                    with open(os.path.join(directory, f'{stem}_{extra + 1}.png'), 'wb') as f:
+                        f.write(png)
+            if rng.random() < config_ratio:
+                with open(os.path.join(directory, f'{stem}.json'), 'w', encoding='utf-8') as f:
+                    json.dump({'activation text': stem.replace('_', ' '), 'preferred weight': 0.8,
+                               'notes': '', 'description': 'synthetic', 'base_model': '',
+                               'works_in_illustrious': rng.random() < 0.2}, f)
+
+    clicks_path = os.path.join(root, 'clicks.json')
+    click_data = {'global': {}, 'search': {}}
+    for _ in range(clicks):
+        name = rng.choice(names) if names else f'missing_{rng.randint(0, 1000)}.safetensors'
+        click_data['global'][name] = click_data['global'].get(name, 0) + 1
+        term = rng.choice(SEARCH_TERMS)
+        term_clicks = click_data['search'].setdefault(term, {})
+        term_clicks[name] = term_clicks.get(name, 0) + 1
+    with open(clicks_path, 'w', encoding='utf-8') as f:
+        json.dump(click_data, f, indent=4)
+
+    return lora_dir, names, clicks_path
+
+
+def process_max_rss_kb():
+    """进程启动以来的最大常驻内存（高水位），不会因为后续释放内存而下降"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，Linux 以 KB 为单位
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def measure(name, request_fn, iterations, warmup=1):
+    """重复调用 request_fn 并统计延迟，返回结果字典"""
+    for _ in range(warmup):
+        request_fn(0)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        response = request_fn(i)
+        latencies.append(time.perf_counter() - t0)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{name} returned {response.status_code}: {response.get_data(as_text=True)[:200]}')
+    total = time.perf_counter() - started
+    latencies.sort()
+    result = {
+        'iterations': iterations,
+        'throughput_rps': round(iterations / total, 2) if total > 0 else None,
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+        'process_max_rss_kb': process_max_rss_kb(),
+    }
+    print(f"{name:<28} {result['throughput_rps']:>10} req/s  p50 {result['p50_ms']:>9} ms  "
+          f"p99 {result['p99_ms']:>9} ms  process max rss {result['process_max_rss_kb']}")
+    return result
+
+
+def setup_app(workdir, lora_dir, clicks_path):
+    """把 main 中的服务替换为指向临时目录的实例
+
+    import main 时仍会按模块中的默认路径打开 backend 目录下的 config.json、
+    clicks.json 和 lora_index.db（不存在时创建索引文件，规则变化时重建索引）；
+    替换之后的测量过程只读写临时目录。
+    """
+    import main
+    from click_store import ClickStore
+    from config_service import ConfigService
+    from hash_service import HashService
+    from lora_library import LoraLibrary
+    from metadata_index import MetadataIndex
+    from thumbnails import ThumbnailCache
+
+    config_path = os.path.join(workdir, 'config.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump({'lora_path': lora_dir, 'watch_library': False, 'hash_loras': False}, f)
+
+    main.config_service = ConfigService(config_path)
+    main.click_store = ClickStore(clicks_path)
+    main.metadata_index = MetadataIndex(os.path.join(workdir, 'lora_index.db'),
+                                        revision=main.base_model_classifier.fingerprint)
+    main.hash_service = HashService(main.metadata_index)
+    main.thumbnail_cache = ThumbnailCache(os.path.join(workdir, 'thumbnails'))
+    main.lora_library = LoraLibrary(main.build_library_records)
+    return main
+
+
+def run_benchmarks(main, lora_dir, names, iterations):
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+
+    client = main.app.test_client()
+    rng = random.Random(1)
+    results = {}
+
+    # 冷扫描：空索引，所有文件头都需要解析
+    results['scan_all_loras_cold'] = measure(
+        'scan-all-loras (cold)', lambda i: client.get('/scan-all-loras?refresh=1'), 1, warmup=0)
+
+    # 索引命中：重新遍历目录，但不再解析文件头
+    results['scan_all_loras_rescan'] = measure(
+        'scan-all-loras (rescan)', lambda i: client.get('/scan-all-loras?refresh=1'), max(1, iterations // 10))
+
+    results['scan_all_loras_cached'] = measure(
+        'scan-all-loras (cached)', lambda i: client.get('/scan-all-loras'), iterations)
+
+    results.update(run_wire_format_benchmarks(client, iterations))
+
+    results['scan_all_loras_search'] = measure(
+        'scan-all-loras (search)',
+        lambda i: client.get(f'/scan-all-loras?search_term={SEARCH_TERMS[i % len(SEARCH_TERMS)]}'), iterations)
+
+    results['scan_all_loras_page'] = measure(
+        'scan-all-loras (page)',
+        lambda i: client.get('/scan-all-loras?limit=50&sort=global_clicks&order=desc'), iterations)
+
+    results['search'] = measure(
+        'search',
+        lambda i: client.get('/search', query_string={'q': SEARCH_TERMS[i % len(SEARCH_TERMS)]}), iterations)
+
+    results['tag_loras'] = measure(
+        'tag-loras',
+        lambda i: client.get('/tag-loras', query_string={'tag': TAG_WORDS[i % len(TAG_WORDS)], 'limit': 50}),
+        iterations)
+
+    records = client.get('/scan-all-loras').get_json()['lora_files']
+    folders = sorted({record['relative_path'] for record in records})
+    results['get_lora_files'] = measure(
+        'lora-files',
+        lambda i: client.get('/lora-files', query_string={'path': folders[i % len(folders)]}), iterations)
+
+    with_preview = [record for record in records if record['has_preview']] or records
+    results['get_previews'] = measure(
+        'previews',
+        lambda i: client.get('/previews', query_string={
+            'name': with_preview[i % len(with_preview)]['base_name'],
+            'path': with_preview[i % len(with_preview)]['relative_path']}), iterations)
+
+    results['record_lora_click'] = measure(
+        'lora-click',
+        lambda i: client.post('/lora-click', json={
+            'lora_name': rng.choice(names), 'search_term': rng.choice(SEARCH_TERMS)}), iterations)
+
+    main.click_store.flush()
+    return results
+
+
+def run_wire_format_benchmarks(client, iterations):
+    """对比 /scan-all-loras 在各种输出格式和压缩算法下的响应大小与耗时"""
+    import wire_format
+    encodings = ['identity', 'gzip'] + (['br'] if wire_format.brotli is not None else [])
+    results = {}
+    for name, params in WIRE_FORMATS:
+        if params.get('format') == 'msgpack' and wire_format.msgpack is None:
+            print(f'wire {name:<23} skipped (msgpack is not installed)')
+            continue
+        for encoding in encodings:
+            headers = {'Accept-Encoding': encoding}
+            result = measure(f'wire {name}/{encoding}',
+                             lambda i: client.get('/scan-all-loras', query_string=params, headers=headers),
+                             iterations)
+            result['bytes'] = len(client.get('/scan-all-loras', query_string=params, headers=headers).get_data())
+            results[f'wire_{name}_{encoding}'] = result
+
+    baseline = results['wire_json_identity']
+    print(f"\n{'format':<28} {'bytes':>10} {'size':>7} {'p50':>10}")
+    for key, result in results.items():
+        print(f"{key[len('wire_'):]:<28} {result['bytes']:>10} {result['bytes'] / baseline['bytes']:>6.1%} "
+              f"{result['p50_ms']:>7} ms")
+    print()
+    return results
+
+
+def compare(results, baseline_path):
+    """与之前保存的结果对比，打印 p50 和吞吐量的变化"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f).get('results', {})
+    print(f'\nCompared with {baseline_path}:')
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old or not old.get('p50_ms'):
+            continue
+        ratio = result['p50_ms'] / old['p50_ms'] if old['p50_ms'] else float('inf')
+        print(f"{name:<28} p50 {old['p50_ms']:>9} -> {result['p50_ms']:>9} ms  ({ratio:.2f}x)")
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark LoraReader backend endpoints on a synthetic library')
+    parser.add_argument('--folders', type=int, default=10)
+    parser.add_argument('--loras-per-folder', type=int, default=50)
+    parser.add_argument('--depth', type=int, default=2, help='maximum folder nesting depth')
+    parser.add_argument('--preview-ratio', type=float, default=0.8)
+    parser.add_argument('--config-ratio', type=float, default=0.5)
+    parser.add_argument('--tensors', type=int, default=200, help='tensor entries per safetensors header')
+    parser.add_argument('--clicks', type=int, default=5000, help='click records in the generated clicks.json')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', help='directory for the synthetic library (default: temporary directory)')
+    parser.add_argument('--keep', action='store_true', help='keep the generated library after the run')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare against a previous results JSON file')
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='lorareader_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        t0 = time.perf_counter()
+        lora_dir, names, clicks_path = generate_library(
+            workdir, args.folders, args.loras_per_folder, args.depth, args.preview_ratio,
+            args.config_ratio, args.tensors, args.clicks, args.seed)
+        print(f'Generated {len(names)} LoRAs in {time.perf_counter() - t0:.1f}s at {workdir}')
+
+        main = setup_app(workdir, lora_dir, clicks_path)
+        results = run_benchmarks(main, lora_dir, names, args.iterations)
+
+        report = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {key: value for key, value in vars(args).items()
+                       if key not in ('workdir', 'keep', 'output', 'baseline')},
+            'lora_count': len(names),
+            'results': results,
+        }
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=4)
+            print(f'Results saved to {args.output}')
+        if args.baseline:
+            compare(results, args.baseline)
+        return report
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main_cli()
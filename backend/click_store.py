@@ -0,0 +1,136 @@
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 点击数据写回磁盘的默认间隔（秒）
+DEFAULT_FLUSH_INTERVAL = 2.0
+
+
+class ClickStore:
+    """进程内的点击量存储
+
+    clicks.json 只在第一次访问时读取一次；点击记录在内存中更新，
+    由后台线程定期合并写回，进程退出时再写回一次。写文件使用
+    临时文件加重命名，避免写到一半的文件损坏已有数据。
+    """
+
+    def __init__(self, path, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        # 保证写文件的顺序与序列化的顺序一致
+        self._write_lock = threading.Lock()
+        self._data = None
+        self._dirty = False
+        self._flush_thread = None
+        self._stop = threading.Event()
+        atexit.register(self.close)
+
+    def _read(self):
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                # 如果是旧格式，转换为新格式
+                if not isinstance(data, dict) or ('global' not in data and 'search' not in data):
+                    self._dirty = True
+                    return {
+                        "global": data if isinstance(data, dict) else {},
+                        "search": {}
+                    }
+                data.setdefault("global", {})
+                data.setdefault("search", {})
+                return data
+        except Exception as e:
+            logger.error(f"Error loading clicks: {e}")
+        return {"global": {}, "search": {}}
+
+    def _ensure_loaded(self):
+        # 调用方需持有 self._lock
+        if self._data is None:
+            self._data = self._read()
+        return self._data
+
+    def get_counts(self, lora_name, search_term=None):
+        """返回 (全局点击数, 搜索词相关点击数)"""
+        with self._lock:
+            data = self._ensure_loaded()
+            global_clicks = data["global"].get(lora_name, 0)
+            search_clicks = data["search"].get(search_term, {}).get(lora_name, 0) if search_term else 0
+        return global_clicks, search_clicks
+
+    def search_counts(self, search_term):
+        """返回某个搜索词下各 LoRA 的点击数副本"""
+        with self._lock:
+            return dict(self._ensure_loaded()["search"].get(search_term, {}))
+
+    def record(self, lora_name, search_term=None):
+        """记录一次点击，返回更新后的 (全局点击数, 搜索词相关点击数)"""
+        with self._lock:
+            data = self._ensure_loaded()
+            # 更新全局点击量
+            data["global"][lora_name] = data["global"].get(lora_name, 0) + 1
+
+            # 如果有搜索词，更新搜索相关点击量
+            search_clicks = 0
+            if search_term:
+                term_clicks = data["search"].setdefault(search_term, {})
+                term_clicks[lora_name] = term_clicks.get(lora_name, 0) + 1
+                search_clicks = term_clicks[lora_name]
+
+            self._dirty = True
+            global_clicks = data["global"][lora_name]
+
+        self._start_flush_thread()
+        return global_clicks, search_clicks
+
+    def _start_flush_thread(self):
+        if self._flush_thread is not None:
+            return
+        with self._lock:
+            if self._flush_thread is None:
+                self._flush_thread = threading.Thread(
+                    target=self._flush_loop, name='click-store-flush', daemon=True)
+                self._flush_thread.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """把未保存的点击数据写回磁盘"""
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty or self._data is None:
+                    return
+                content = json.dumps(self._data, indent=4, ensure_ascii=False)
+                self._dirty = False
+            self._write(content)
+
+    def _write(self, content):
+        try:
+            directory = os.path.dirname(self.path) or '.'
+            fd, temp_path = tempfile.mkstemp(prefix='clicks_', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.path)
+            except Exception:
+                os.remove(temp_path)
+                raise
+        except Exception as e:
+            logger.error(f"Error saving clicks: {e}")
+            # 写入失败时保留脏标记，下次重试
+            with self._lock:
+                self._dirty = True
+
+    def close(self):
+        self._stop.set()
+        self.flush()
@@ -0,0 +1,80 @@
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {"lora_path": ""}
+
+
+class ConfigService:
+    """缓存 config.json 的解析结果
+
+    只有在通过 save() 写入或文件修改时间变化时才重新读取文件，
+    同时缓存 lora_path 的 realpath，供各个接口做路径校验。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._config = None
+        self._mtime_ns = None
+        self._base_realpath = None
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _reload(self, mtime_ns):
+        # 调用方需持有 self._lock
+        config = copy.deepcopy(DEFAULT_CONFIG)
+        try:
+            if mtime_ns is not None:
+                with open(self.path, 'r') as f:
+                    config = json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading config: {e}")
+            config = copy.deepcopy(DEFAULT_CONFIG)
+        self._set(config, mtime_ns)
+
+    def _set(self, config, mtime_ns):
+        self._config = config
+        self._mtime_ns = mtime_ns
+        base_path = config.get('lora_path', '')
+        self._base_realpath = os.path.realpath(base_path) if base_path else ''
+
+    def _current(self):
+        mtime_ns = self._file_mtime()
+        with self._lock:
+            if self._config is None or mtime_ns != self._mtime_ns:
+                self._reload(mtime_ns)
+            return self._config
+
+    def get(self):
+        """返回配置的副本，调用方可以随意修改"""
+        return copy.deepcopy(self._current())
+
+    def base_realpath(self):
+        """返回 lora_path 的 realpath，未配置时返回空字符串"""
+        self._current()
+        with self._lock:
+            return self._base_realpath
+
+    def save(self, config):
+        with self._lock:
+            # 先写临时文件再重命名，并发读取时不会读到写了一半的文件
+            fd, temp_path = tempfile.mkstemp(prefix='config_', suffix='.tmp',
+                                             dir=os.path.dirname(os.path.abspath(self.path)))
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(config, f, indent=4)
+                os.replace(temp_path, self.path)
+            except Exception:
+                os.remove(temp_path)
+                raise
+            self._set(copy.deepcopy(config), self._file_mtime())
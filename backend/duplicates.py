@@ -0,0 +1,108 @@
+import hashlib
+import logging
+import os
+import struct
+
+from safetensors_header import MAX_HEADER_SIZE
+
+logger = logging.getLogger(__name__)
+
+# 快速哈希额外读取的张量数据量（文件头之后和文件末尾各读取这么多）
+QUICK_HASH_SAMPLE = 64 * 1024
+
+
+def quick_hash(file_path, sample_size=QUICK_HASH_SAMPLE):
+    """对 safetensors 文件头和首尾各一小段张量数据做 SHA-256
+
+    文件头包含全部张量的名称、形状和训练元数据，改名或复制的文件头完全相同；
+    再加上首尾采样可以区分同一次训练的不同 epoch。结果只用于缩小候选范围，
+    最终是否重复仍以完整哈希为准；不是 safetensors 的文件（长度前缀不合法）
+    只对首尾采样做哈希。
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        prefix = f.read(8)
+        digest.update(prefix)
+        if len(prefix) == 8:
+            header_size = struct.unpack('<Q', prefix)[0]
+            if 0 < header_size <= min(MAX_HEADER_SIZE, size - 8):
+                digest.update(f.read(header_size))
+        digest.update(f.read(sample_size))
+        f.seek(max(f.tell(), size - sample_size))
+        digest.update(f.read(sample_size))
+    return digest.hexdigest()
+
+
+def _group(items, key):
+    groups = {}
+    for item in items:
+        try:
+            value = key(item)
+        except OSError as e:
+            logger.warning(f"Skipping {item['path']} in duplicate scan: {e}")
+            continue
+        groups.setdefault(value, []).append(item)
+    return [(value, group) for value, group in groups.items() if len(group) > 1]
+
+
+def find_duplicates(paths, hash_file, verify=True):
+    """逐级缩小范围查找内容相同的文件
+
+    1. 按文件大小分组，大小唯一的文件直接排除（只需要 stat）；
+    2. 同样大小的文件按 quick_hash 分组（只读取文件头和少量数据）；
+    3. verify 为 True 时，剩余候选再用 hash_file(路径) 计算完整 SHA-256 确认，
+       hash_file 返回 None 表示计算失败。
+
+    指向同一 inode 的硬链接视为同一份数据，不计入可回收空间。
+    返回 (重复组列表, 各阶段统计)，每组为 {size, sha256, quick_hash, files, reclaimable_bytes}。
+    """
+    files = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            logger.warning(f"Skipping {path} in duplicate scan: {e}")
+            continue
+        files.append({'path': path, 'size': stat.st_size, 'inode': (stat.st_dev, stat.st_ino)})
+
+    stats = {'files': len(files), 'size_candidates': 0, 'quick_candidates': 0, 'hashed': 0}
+
+    size_groups = _group(files, lambda item: item['size'])
+    stats['size_candidates'] = sum(len(group) for _, group in size_groups)
+
+    candidates = []
+    for _, group in size_groups:
+        candidates.extend(_group(group, lambda item: quick_hash(item['path'])))
+    stats['quick_candidates'] = sum(len(group) for _, group in candidates)
+
+    duplicates = []
+    for quick, group in candidates:
+        if verify:
+            hashed = {}
+            by_inode = {}
+            for item in group:
+                # 硬链接内容必然相同，每个 inode 只计算一次
+                if item['inode'] not in by_inode:
+                    by_inode[item['inode']] = hash_file(item['path'])
+                    stats['hashed'] += 1
+                hashes = by_inode[item['inode']]
+                if hashes is not None:
+                    hashed.setdefault(hashes['sha256'], []).append(item)
+            groups = [(sha256, items) for sha256, items in hashed.items() if len(items) > 1]
+        else:
+            groups = [(None, group)]
+
+        for sha256, items in groups:
+            size = items[0]['size']
+            distinct = len({item['inode'] for item in items})
+            duplicates.append({
+                'size': size,
+                'sha256': sha256,
+                'quick_hash': quick,
+                'files': [item['path'] for item in items],
+                'reclaimable_bytes': size * (distinct - 1),
+            })
+
+    duplicates.sort(key=lambda group: group['reclaimable_bytes'], reverse=True)
+    return duplicates, stats
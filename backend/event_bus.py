@@ -0,0 +1,116 @@
+import json
+import logging
+import queue
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 保留最近多少条事件，客户端断线重连时按 Last-Event-ID 补发
+DEFAULT_HISTORY_SIZE = 1000
+
+# 单个订阅者最多积压的事件数，超出后要求该客户端重新加载完整数据
+DEFAULT_QUEUE_SIZE = 1000
+
+# 没有事件时发送注释行的间隔（秒），防止连接被代理或浏览器判定为空闲
+HEARTBEAT_INTERVAL = 15
+
+# 客户端需要丢弃增量、重新加载完整数据时收到的事件类型
+RESYNC_EVENT = 'resync'
+
+
+class Subscription:
+    """一个 SSE 连接的事件队列"""
+
+    def __init__(self, queue_size):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def get(self, timeout=None):
+        """等待下一条事件 (id, 类型, 数据)，超时返回 None"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    """进程内的事件广播，用于向前端推送 LoRA 库的增量变化
+
+    每条事件带有递增的编号；最近的事件保存在环形缓冲中，客户端带着
+    Last-Event-ID 重连时补发错过的事件，缓冲中已找不到时发送 resync。
+    发布操作不会阻塞：处理不过来的订阅者会收到 resync 并断开。
+    """
+
+    def __init__(self, history_size=DEFAULT_HISTORY_SIZE, queue_size=DEFAULT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        self._last_id = 0
+
+    def publish(self, event_type, data):
+        """广播一条事件，返回事件编号"""
+        with self._lock:
+            self._last_id += 1
+            event = (self._last_id, event_type, data)
+            self._history.append(event)
+            for subscription in list(self._subscribers):
+                self._deliver(subscription, event)
+            return self._last_id
+
+    def _deliver(self, subscription, event):
+        # 调用方需持有 self._lock
+        try:
+            subscription.queue.put_nowait(event)
+        except queue.Full:
+            logger.warning("Event subscriber is too slow, asking it to resync")
+            subscription.overflowed = True
+            self._subscribers.discard(subscription)
+
+    def subscribe(self, last_event_id=None):
+        """新建订阅；last_event_id 之后的历史事件会先放入队列"""
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            if last_event_id is not None and last_event_id > self._last_id:
+                # 编号比当前最新事件还大，说明服务已经重启过
+                missed = [(self._last_id, RESYNC_EVENT, {'reason': 'server_restarted'})]
+            elif last_event_id is not None and last_event_id < self._last_id:
+                missed = [event for event in self._history if event[0] > last_event_id]
+                if not missed or missed[0][0] != last_event_id + 1 or len(missed) > self.queue_size:
+                    # 错过的事件已经不在缓冲中
+                    missed = [(self._last_id, RESYNC_EVENT, {'reason': 'history_expired'})]
+            else:
+                missed = []
+            for event in missed:
+                subscription.queue.put_nowait(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stream(self, subscription, heartbeat=HEARTBEAT_INTERVAL):
+        """把订阅转换为 text/event-stream 格式的文本流"""
+        try:
+            # hello 不带 id，避免补发事件之前断线时客户端跳过这些事件
+            yield f'retry: 3000\nevent: hello\ndata: {json.dumps({"last_event_id": self._last_id})}\n\n'
+            while True:
+                if subscription.overflowed:
+                    # 队列已满时后续事件被丢弃，积压的事件不再有意义
+                    yield format_event((self._last_id, RESYNC_EVENT, {'reason': 'overflow'}))
+                    return
+                event = subscription.get(timeout=heartbeat)
+                if event is None:
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_event(event)
+        finally:
+            self.unsubscribe(subscription)
+
+
+def format_event(event):
+    event_id, event_type, data = event
+    payload = json.dumps(data, ensure_ascii=False)
+    return f'id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n'
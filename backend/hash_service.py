@@ -0,0 +1,213 @@
+import hashlib
+import logging
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 顺序读取的块大小，大块读取在机械硬盘和网络盘上吞吐量更高
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+# 后台计算时的默认读取速率上限（MB/s），0 表示不限速
+DEFAULT_RATE_LIMIT_MB = 64
+
+# 用于查询的哈希前缀最短长度
+MIN_HASH_PREFIX = 8
+
+
+def compute_lora_hashes(file_path, chunk_size=HASH_CHUNK_SIZE, throttle=None):
+    """一次顺序读取同时计算两种哈希
+
+    sha256：整个文件的 SHA-256，前 10 位即 Civitai 的 AutoV2；
+    addnet：跳过 safetensors 文件头后的 SHA-256，前 12 位即 WebUI 写入
+    图片 "Lora hashes" 的短哈希。
+    throttle(已读字节数) 在每块读取后调用，用于限速。
+    """
+    full = hashlib.sha256()
+    addnet = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        prefix = f.read(8)
+        full.update(prefix)
+        data_offset = 8 + struct.unpack('<Q', prefix)[0] if len(prefix) == 8 else len(prefix)
+        position = len(prefix)
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            full.update(chunk)
+            end = position + len(chunk)
+            if end > data_offset:
+                addnet.update(chunk[max(0, data_offset - position):])
+            position = end
+            if throttle:
+                throttle(position)
+    return {'sha256': full.hexdigest(), 'addnet': addnet.hexdigest()}
+
+
+def normalize_hash(value):
+    """清理用户传入的哈希：去掉空白和 0x 前缀并转为小写，不是十六进制时返回空字符串"""
+    value = (value or '').strip().lower()
+    if value.startswith('0x'):
+        value = value[2:]
+    if len(value) < MIN_HASH_PREFIX or any(c not in '0123456789abcdef' for c in value):
+        return ''
+    return value
+
+
+class _Hashing:
+    """一个正在计算的文件：其他线程等待它完成，急用时可以解除限速"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.unthrottled = False
+
+
+class HashService:
+    """在后台线程中计算 LoRA 文件哈希并写入元数据索引
+
+    队列去重；每个文件计算前先检查索引中 (大小, 修改时间) 一致的结果，
+    已有结果的文件不会被再次读取。后台计算的读取速度按 rate_limit_mb 限制，
+    避免扫描大型模型库时占满磁盘带宽；请求中直接调用 hash_file 时不限速。
+    同一个文件同时只计算一次，其他调用方等待结果。
+    """
+
+    def __init__(self, index, rate_limit_mb=DEFAULT_RATE_LIMIT_MB, chunk_size=HASH_CHUNK_SIZE):
+        self.index = index
+        self.rate_limit_mb = rate_limit_mb
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._queued = set()
+        # 正在计算的文件 {路径: _Hashing}
+        self._hashing = {}
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.current = None
+        self.hashed = 0
+        self.failed = 0
+
+    def enqueue(self, paths):
+        added = 0
+        with self._lock:
+            for path in paths:
+                if path not in self._queued:
+                    self._queued.add(path)
+                    self._queue.append(path)
+                    added += 1
+            if added and (self._thread is None or not self._thread.is_alive()):
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='lora-hasher', daemon=True)
+                self._thread.start()
+        if added:
+            self._wakeup.set()
+        return added
+
+    @property
+    def pending(self):
+        with self._lock:
+            return len(self._queue) + (1 if self.current else 0)
+
+    def status(self):
+        with self._lock:
+            return {
+                'pending': len(self._queue) + (1 if self.current else 0),
+                'current': self.current,
+                'hashed': self.hashed,
+                'failed': self.failed,
+                'rate_limit_mb': self.rate_limit_mb,
+            }
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def _next(self):
+        with self._lock:
+            if not self._queue:
+                self.current = None
+                return None
+            path = self._queue.popleft()
+            self._queued.discard(path)
+            self.current = path
+            return path
+
+    def _run(self):
+        while not self._stop.is_set():
+            path = self._next()
+            if path is None:
+                self._wakeup.clear()
+                # 等待新任务，空闲一段时间后线程退出，下次入队时重新启动
+                if not self._wakeup.wait(30):
+                    with self._lock:
+                        if not self._queue:
+                            self._thread = None
+                            return
+                continue
+            self.hash_file(path, throttle=True)
+        with self._lock:
+            self.current = None
+
+    def hash_file(self, path, throttle=False):
+        """计算单个文件的哈希（已有最新结果时直接返回），失败时返回 None
+
+        throttle 为 True 时按 rate_limit_mb 限速，只用于后台队列；请求线程中的
+        调用不限速。文件正在被其他线程计算时等待其结果，不限速的调用会同时
+        解除对方的限速。
+        """
+        try:
+            while True:
+                stat = os.stat(path)
+                cached = self.index.get_hashes(path, stat.st_size, stat.st_mtime_ns)
+                if cached is not None:
+                    return cached
+                with self._lock:
+                    hashing = self._hashing.get(path)
+                    if hashing is None:
+                        hashing = self._hashing[path] = _Hashing()
+                        hashing.unthrottled = not throttle
+                        break
+                    if not throttle:
+                        hashing.unthrottled = True
+                # 对方计算失败时索引中没有结果，循环后由本线程重新计算
+                hashing.done.wait()
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            logger.error(f"Error hashing {path}: {e}")
+            return None
+
+        try:
+            started = time.perf_counter()
+            hashes = compute_lora_hashes(path, self.chunk_size, self._throttle(started, hashing))
+            self.index.put_hashes(path, stat.st_size, stat.st_mtime_ns, hashes)
+            with self._lock:
+                self.hashed += 1
+            logger.info(f"Hashed {os.path.basename(path)} in {time.perf_counter() - started:.2f}s")
+            return hashes
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            logger.error(f"Error hashing {path}: {e}")
+            return None
+        finally:
+            with self._lock:
+                del self._hashing[path]
+            hashing.done.set()
+
+    def _throttle(self, started, hashing):
+        if not self.rate_limit_mb or self.rate_limit_mb <= 0:
+            return None
+        bytes_per_second = self.rate_limit_mb * 1024 * 1024
+
+        def throttle(bytes_read):
+            if hashing.unthrottled:
+                return
+            # 读取进度超前于限速时休眠，stop() 可以打断等待
+            ahead = bytes_read / bytes_per_second - (time.perf_counter() - started)
+            if ahead > 0:
+                self._stop.wait(ahead)
+        return throttle
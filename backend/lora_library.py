@@ -0,0 +1,326 @@
+import logging
+import os
+import threading
+import uuid
+from collections import deque
+
+from lora_scanner import scan_lora_directory, walk_lora_tree
+
+logger = logging.getLogger(__name__)
+
+# 完整扫描时每累积多少个 LoRA 批量解析一次，兼顾并发解析和首批结果的延迟
+LOAD_BATCH_SIZE = 64
+
+# 变更日志最多保留的记录条数，更早的版本只能完整重新同步
+CHANGELOG_SIZE = 10000
+
+
+def join_relative(parent, name):
+    """拼接相对路径，根目录使用空字符串表示"""
+    return os.path.join(parent, name) if parent else name
+
+
+def normalize_relative(sub_path):
+    """把请求中的子路径转换为库内部使用的相对路径格式"""
+    sub_path = (sub_path or '').strip('/\\')
+    if not sub_path:
+        return ''
+    normalized = os.path.normpath(sub_path)
+    return '' if normalized == '.' else normalized
+
+
+class LibraryChanges:
+    """一次目录刷新产生的变化"""
+
+    def __init__(self):
+        self.added = []
+        self.updated = []
+        self.removed = []
+        self.removed_paths = []
+        # 这次变化之后的库版本号
+        self.generation = None
+
+    def __bool__(self):
+        return bool(self.added or self.updated or self.removed)
+
+    def __repr__(self):
+        return f"LibraryChanges(added={len(self.added)}, updated={len(self.updated)}, removed={len(self.removed)})"
+
+
+class _LibraryDirectory:
+    __slots__ = ('subdirs', 'entries', 'records')
+
+    def __init__(self, subdirs, entries, records=None):
+        self.subdirs = subdirs
+        self.entries = entries
+        self.records = records if records is not None else []
+
+
+class LoraLibrary:
+    """内存中的 LoRA 库，按目录保存扫描结果
+
+    build_records 接收 [(相对路径, LoraEntry)] 列表，返回对应顺序的 LoRA 信息字典。
+    读取操作只做内存查找；文件变化时由监视器调用 refresh_directory 增量更新。
+    """
+
+    def __init__(self, build_records):
+        self._build_records = build_records
+        self._lock = threading.RLock()
+        # 串行化刷新操作，避免两个刷新同时扫描同一个目录
+        self._refresh_lock = threading.Lock()
+        self._dirs = {}
+        self._flat = None
+        self.base_path = None
+        self.loaded = False
+        # 每次库内容变化时递增，供搜索索引等派生数据判断是否需要重建
+        self.generation = 0
+        # 每次完整加载生成新的 epoch；客户端持有的版本号只在同一个 epoch 内有意义
+        self.epoch = None
+        # [(版本号, 'added' / 'updated' / 'removed', (相对路径, 文件名), 记录)]
+        self._changelog = deque()
+        # 正在进行的完整扫描各自记录扫描期间被刷新的目录，发布新数据后重新刷新这些目录
+        self._loads = []
+        # 早于该版本的变化已经不在日志中
+        self._changelog_floor = 0
+
+    def iter_load(self, base_path, on_error=None, on_scan=None):
+        """完整扫描整个目录树，每解析完一批就产出这一批 LoRA 记录的列表
+
+        扫描全部完成后才替换库中的数据；中途关闭生成器不会影响已有数据。
+        产出记录时不持有任何锁，读取缓慢的调用方不会阻塞目录刷新；扫描期间
+        被刷新的目录在新数据发布后再刷新一次，避免丢失这段时间内的变化。
+        on_scan(相对路径, 目录中的 LoRA 数) 在遍历到每个目录时调用，用于报告进度。
+        生成器的返回值表示扫描过程中是否没有出错。
+        """
+        errors = []
+        dirs = {}
+        pending = []
+
+        def handle_error(directory, error):
+            errors.append(directory)
+            if on_error:
+                on_error(directory, error)
+
+        def flush_pending():
+            records = self._build_records(pending)
+            for (relative_path, _), record in zip(pending, records):
+                dirs[relative_path].records.append(record)
+            pending.clear()
+            return records
+
+        refreshed = set()
+        with self._lock:
+            self._loads.append(refreshed)
+        try:
+            for relative_path, scanned in walk_lora_tree(base_path, handle_error):
+                dirs[relative_path] = _LibraryDirectory(scanned.subdirs, scanned.loras)
+                pending.extend((relative_path, entry) for entry in scanned.loras)
+                if on_scan:
+                    on_scan(relative_path, len(scanned.loras))
+                if len(pending) >= LOAD_BATCH_SIZE:
+                    yield flush_pending()
+            if pending:
+                yield flush_pending()
+
+            with self._refresh_lock, self._lock:
+                same_path = self.base_path == base_path
+                self._dirs = dirs
+                self._invalidate()
+                self.base_path = base_path
+                self.loaded = True
+                self.epoch = uuid.uuid4().hex
+                self._changelog.clear()
+                self._changelog_floor = self.generation
+        finally:
+            with self._lock:
+                self._loads.remove(refreshed)
+
+        logger.info(f"Loaded {sum(len(d.records) for d in dirs.values())} LoRAs from {base_path}")
+        if same_path:
+            for relative_path in sorted(refreshed):
+                self.refresh_directory(relative_path)
+        return not errors
+
+    def _scan_tree(self, directory, relative_root, on_error=None):
+        dirs = {}
+        pending = []
+        for relative_path, scanned in walk_lora_tree(directory, on_error, relative_root):
+            dirs[relative_path] = _LibraryDirectory(scanned.subdirs, scanned.loras)
+            pending.extend((relative_path, entry) for entry in scanned.loras)
+
+        records = self._build_records(pending) if pending else []
+        for (relative_path, _), record in zip(pending, records):
+            dirs[relative_path].records.append(record)
+        return dirs
+
+    def _subtree_keys(self, relative_path):
+        if not relative_path:
+            return list(self._dirs)
+        prefix = relative_path + os.sep
+        return [key for key in self._dirs if key == relative_path or key.startswith(prefix)]
+
+    def refresh_directory(self, relative_path):
+        """重新扫描单个目录，新出现的子目录会被完整扫描，返回 LibraryChanges"""
+        changes = LibraryChanges()
+        if not self.loaded:
+            return changes
+
+        with self._lock:
+            for refreshed in self._loads:
+                refreshed.add(relative_path)
+
+        with self._refresh_lock:
+            directory = os.path.join(self.base_path, relative_path) if relative_path else self.base_path
+
+            if not os.path.isdir(directory):
+                with self._lock:
+                    self._remove_subtree(relative_path, changes)
+                    parent = os.path.dirname(relative_path)
+                    parent_dir = self._dirs.get(parent) if relative_path else None
+                    if parent_dir is not None:
+                        name = os.path.basename(relative_path)
+                        parent_dir.subdirs = [d for d in parent_dir.subdirs if d != name]
+                    self._commit_changes(changes)
+                return changes
+
+            try:
+                scanned = scan_lora_directory(directory)
+            except OSError as e:
+                logger.error(f"Error refreshing directory {directory}: {e}")
+                return changes
+
+            with self._lock:
+                old = self._dirs.get(relative_path)
+                known_subdirs = set(old.subdirs) if old else set()
+
+            new_records = self._build_records([(relative_path, entry) for entry in scanned.loras])
+
+            # 新出现的子目录完整扫描一次
+            new_subtrees = {}
+            for name in scanned.subdirs:
+                child = join_relative(relative_path, name)
+                if name not in known_subdirs or child not in self._dirs:
+                    new_subtrees.update(self._scan_tree(os.path.join(directory, name), child))
+
+            with self._lock:
+                old = self._dirs.get(relative_path)
+                old_records = {r['name']: r for r in old.records} if old else {}
+                old_entries = {e.name: e for e in old.entries} if old else {}
+
+                for name in known_subdirs - set(scanned.subdirs):
+                    self._remove_subtree(join_relative(relative_path, name), changes)
+
+                self._dirs[relative_path] = _LibraryDirectory(scanned.subdirs, scanned.loras, new_records)
+
+                for record in new_records:
+                    previous = old_records.pop(record['name'], None)
+                    if previous is None:
+                        changes.added.append(record)
+                    elif previous != record:
+                        changes.updated.append(record)
+                for name, record in old_records.items():
+                    changes.removed.append(record)
+                    changes.removed_paths.append(old_entries[name].path)
+
+                for key, child in new_subtrees.items():
+                    self._dirs[key] = child
+                    changes.added.extend(child.records)
+
+                # 目录本身是新的，需要登记到父目录
+                if old is None and relative_path:
+                    parent_dir = self._dirs.get(os.path.dirname(relative_path))
+                    name = os.path.basename(relative_path)
+                    if parent_dir is not None and name not in parent_dir.subdirs:
+                        parent_dir.subdirs = sorted(parent_dir.subdirs + [name])
+
+                self._commit_changes(changes)
+
+        return changes
+
+    def _invalidate(self):
+        # 调用方需持有 self._lock
+        self._flat = None
+        self.generation += 1
+
+    def _commit_changes(self, changes):
+        # 调用方需持有 self._lock
+        # 没有 LoRA 变化时（只是修改时间变化或重复刷新）保持版本号不变，
+        # 以版本号为键的扁平列表、搜索索引等缓存继续有效
+        if changes:
+            self._invalidate()
+            self._log_changes(changes)
+        else:
+            changes.generation = self.generation
+
+    def _log_changes(self, changes):
+        # 调用方需持有 self._lock
+        changes.generation = self.generation
+        for kind, records in (('added', changes.added), ('updated', changes.updated), ('removed', changes.removed)):
+            for record in records:
+                self._changelog.append((self.generation, kind, (record['relative_path'], record['name']), record))
+        while len(self._changelog) > CHANGELOG_SIZE:
+            self._changelog_floor = self._changelog.popleft()[0]
+
+    def changes_since(self, since):
+        """返回版本 since 之后的合并变化 (当前版本, added, updated, removed)
+
+        同一个文件的多次变化只保留最终状态；since 早于日志保留范围或晚于
+        当前版本时返回 None，调用方需要完整重新加载。
+        """
+        with self._lock:
+            if since < self._changelog_floor or since > self.generation:
+                return None
+            generation = self.generation
+            state = {}
+            for version, kind, key, record in self._changelog:
+                if version <= since:
+                    continue
+                if key in state:
+                    state[key][1:] = [kind, record]
+                else:
+                    state[key] = [kind, kind, record]
+
+        added, updated, removed = [], [], []
+        for first, last, record in state.values():
+            if last == 'removed':
+                # 在这段时间内新增又删除的文件，客户端从未见过
+                if first != 'added':
+                    removed.append(record)
+            elif first == 'added':
+                added.append(record)
+            else:
+                updated.append(record)
+        return generation, added, updated, removed
+
+    def _remove_subtree(self, relative_path, changes):
+        for key in self._subtree_keys(relative_path):
+            removed = self._dirs.pop(key)
+            changes.removed.extend(removed.records)
+            changes.removed_paths.extend(entry.path for entry in removed.entries)
+
+    def directory_records(self, relative_path):
+        """返回单个目录下的 LoRA 信息，目录未知时返回 None"""
+        with self._lock:
+            directory = self._dirs.get(relative_path)
+            return list(directory.records) if directory is not None else None
+
+    def all_records(self):
+        """按目录深度优先顺序返回全部 LoRA 信息"""
+        with self._lock:
+            if self._flat is None:
+                flat = []
+                stack = ['']
+                while stack:
+                    relative_path = stack.pop()
+                    directory = self._dirs.get(relative_path)
+                    if directory is None:
+                        continue
+                    flat.extend(directory.records)
+                    for name in reversed(directory.subdirs):
+                        stack.append(join_relative(relative_path, name))
+                self._flat = flat
+            return list(self._flat)
+
+    def lora_paths(self):
+        with self._lock:
+            return [entry.path for d in self._dirs.values() for entry in d.entries]
@@ -0,0 +1,154 @@
+import base64
+import bisect
+import json
+
+# 支持的排序字段及其取值方式
+SORT_FIELDS = {
+    'name': lambda lora: lora.get('name', '').lower(),
+    'modified_time': lambda lora: (lora.get('metadata') or {}).get('modified_time') or 0,
+    'created_time': lambda lora: (lora.get('metadata') or {}).get('created_time') or 0,
+    'global_clicks': lambda lora: lora.get('global_clicks') or 0,
+}
+
+QUERY_PARAMS = ('limit', 'cursor', 'sort', 'order', 'base_model', 'network_module', 'has_preview')
+
+MAX_LIMIT = 1000
+
+
+class QueryError(ValueError):
+    """分页或筛选参数无效"""
+
+
+def get_list(args, name):
+    """读取可以重复出现或用逗号分隔的多值参数"""
+    values = []
+    for value in args.getlist(name):
+        values.extend(v.strip() for v in value.split(',') if v.strip())
+    return values
+
+
+def parse_bool(value):
+    """解析 1/true/yes、0/false/no 形式的布尔参数，其他值抛出 QueryError"""
+    value = value.strip().lower()
+    if value in ('1', 'true', 'yes'):
+        return True
+    if value in ('0', 'false', 'no'):
+        return False
+    raise QueryError(f'Invalid boolean value: {value}')
+
+
+def parse_limit(args, default=None):
+    """读取 limit 参数，必须为正整数，超过 MAX_LIMIT 时截断；未指定时返回 default"""
+    if not args.get('limit'):
+        return default
+    try:
+        limit = int(args['limit'])
+    except ValueError:
+        raise QueryError('Invalid limit')
+    if limit <= 0:
+        raise QueryError('Invalid limit')
+    return min(limit, MAX_LIMIT)
+
+
+def encode_cursor(sort, order, key):
+    raw = json.dumps([sort, order, list(key)], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort, order, key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return sort, order, tuple(key)
+    except Exception:
+        raise QueryError('Invalid cursor')
+
+
+class LoraQuery:
+    """/lora-files 与 /scan-all-loras 的分页、排序和筛选条件"""
+
+    def __init__(self, limit=None, cursor=None, sort='name', order='asc',
+                 base_models=None, network_modules=None, has_preview=None):
+        self.limit = limit
+        self.cursor = cursor
+        self.sort = sort
+        self.order = order
+        self.base_models = base_models or []
+        self.network_modules = network_modules or []
+        self.has_preview = has_preview
+
+    @classmethod
+    def from_args(cls, args):
+        """从请求参数解析查询条件，没有任何相关参数时返回 None 以保持旧的返回格式"""
+        if not any(name in args for name in QUERY_PARAMS):
+            return None
+
+        limit = parse_limit(args)
+
+        sort = args.get('sort', 'name')
+        if sort not in SORT_FIELDS:
+            raise QueryError(f'Invalid sort field: {sort}')
+
+        order = args.get('order', 'asc')
+        if order not in ('asc', 'desc'):
+            raise QueryError(f'Invalid sort order: {order}')
+
+        cursor = None
+        if args.get('cursor'):
+            cursor_sort, cursor_order, key = decode_cursor(args['cursor'])
+            if (cursor_sort, cursor_order) != (sort, order):
+                raise QueryError('Cursor does not match sort order')
+            cursor = key
+
+        has_preview = parse_bool(args['has_preview']) if args.get('has_preview') else None
+
+        return cls(limit, cursor, sort, order,
+                   get_list(args, 'base_model'), get_list(args, 'network_module'), has_preview)
+
+    def matches(self, lora):
+        metadata = lora.get('metadata') or {}
+        if self.base_models:
+            base_model = metadata.get('base_model')
+            # 与前端一致：筛选 SDXL-Illustrious 时同时包含标记为兼容 Illustrious 的 LoRA
+            compatible = ('SDXL-Illustrious' in self.base_models
+                          and (lora.get('config') or {}).get('works_in_illustrious'))
+            if base_model not in self.base_models and not compatible:
+                return False
+        if self.network_modules and metadata.get('ss_network_module') not in self.network_modules:
+            return False
+        if self.has_preview is not None and bool(lora.get('has_preview')) != self.has_preview:
+            return False
+        return True
+
+    def sort_key(self, lora):
+        # 以相对路径和文件名作为次级键，保证同值条目的顺序稳定且游标唯一
+        return (SORT_FIELDS[self.sort](lora), lora.get('relative_path', ''), lora.get('name', ''))
+
+    def apply(self, loras):
+        """筛选、排序并截取一页，返回 (当前页, 下一页游标, 筛选后的总数)"""
+        items = [lora for lora in loras if self.matches(lora)]
+        keyed = sorted(((self.sort_key(lora), lora) for lora in items),
+                       key=lambda item: item[0], reverse=self.order == 'desc')
+        keys = [key for key, _ in keyed]
+
+        start = 0
+        if self.cursor is not None:
+            if self.order == 'desc':
+                # 降序列表中查找第一个小于游标的位置
+                lo, hi = 0, len(keys)
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if keys[mid] < self.cursor:
+                        hi = mid
+                    else:
+                        lo = mid + 1
+                start = lo
+            else:
+                start = bisect.bisect_right(keys, self.cursor)
+
+        end = len(keyed) if self.limit is None else start + self.limit
+        page = [lora for _, lora in keyed[start:end]]
+        next_cursor = None
+        if end < len(keyed) and page:
+            next_cursor = encode_cursor(self.sort, self.order, keys[end - 1])
+        return page, next_cursor, len(items)
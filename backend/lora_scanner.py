@@ -0,0 +1,134 @@
+import os
+
+from metrics import metrics
+
+LORA_EXT = '.safetensors'
+SIDECAR_EXTS = ('.png', '.json')
+
+
+def _sidecar_stems(file_name, ext):
+    """返回一个附属文件可以匹配的所有 LoRA 基础名
+
+    与原先 ``f.startswith(base_name + '.')`` 的匹配规则一致：
+    ``foo.png`` 和 ``foo.preview.png`` 都属于 ``foo.safetensors``。
+    """
+    stem = file_name[:-len(ext)]
+    stems = [stem]
+    index = stem.find('.')
+    while index != -1:
+        stems.append(stem[:index])
+        index = stem.find('.', index + 1)
+    return stems
+
+
+class LoraDirectory:
+    """单个目录的扫描结果"""
+
+    def __init__(self, path):
+        self.path = path
+        self.subdirs = []
+        self.loras = []
+
+
+class LoraEntry:
+    """目录中的一个 LoRA 文件及其附属文件"""
+
+    __slots__ = ('name', 'base_name', 'path', 'stat', 'preview_file', 'preview_stat', 'config_file')
+
+    def __init__(self, name, path, stat, preview_file, config_file, preview_stat=None):
+        self.name = name
+        # 保持原有的 base_name 格式（带结尾的点），前端依赖这一格式
+        self.base_name = name[:-11]
+        self.path = path
+        self.stat = stat
+        self.preview_file = preview_file
+        self.preview_stat = preview_stat
+        self.config_file = config_file
+
+
+@metrics.timed('listdir')
+def scan_lora_directory(directory):
+    """用一次 os.scandir 列出目录，并按基础名把附属文件分桶
+
+    每个目录只列出一次，LoRA 的预览图和配置文件通过字典 O(1) 查找。
+    结果按文件名排序，保证扫描顺序稳定。
+    """
+    result = LoraDirectory(directory)
+    lora_entries = []
+    buckets = {ext: {} for ext in SIDECAR_EXTS}
+    dir_entries = {}
+
+    with os.scandir(directory) as it:
+        for entry in it:
+            name = entry.name
+            try:
+                if entry.is_dir():
+                    result.subdirs.append(name)
+                    continue
+            except OSError:
+                continue
+
+            if name.endswith(LORA_EXT):
+                lora_entries.append(entry)
+                continue
+
+            for ext in SIDECAR_EXTS:
+                if name.endswith(ext):
+                    dir_entries[name] = entry
+                    bucket = buckets[ext]
+                    for stem in _sidecar_stems(name, ext):
+                        bucket.setdefault(stem, []).append(name)
+                    break
+
+    result.subdirs.sort()
+
+    def find_sidecar(stem, ext):
+        candidates = buckets[ext].get(stem)
+        if not candidates:
+            return None
+        exact = stem + ext
+        return exact if exact in candidates else min(candidates)
+
+    for entry in sorted(lora_entries, key=lambda e: e.name):
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        stem = entry.name[:-len(LORA_EXT)]
+        preview_file = find_sidecar(stem, '.png')
+        preview_stat = None
+        if preview_file:
+            # 预览图的修改时间和大小用作图片 URL 的版本号
+            try:
+                preview_stat = dir_entries[preview_file].stat()
+            except OSError:
+                pass
+        result.loras.append(LoraEntry(
+            entry.name,
+            entry.path,
+            stat,
+            preview_file,
+            find_sidecar(stem, '.json'),
+            preview_stat
+        ))
+
+    return result
+
+
+def walk_lora_tree(base_path, on_error=None, relative_root=''):
+    """递归遍历 LoRA 目录树，依次产出 (相对路径, LoraDirectory)"""
+    stack = [(relative_root, base_path)]
+    while stack:
+        relative_path, directory = stack.pop()
+        try:
+            scanned = scan_lora_directory(directory)
+        except OSError as e:
+            if on_error:
+                on_error(directory, e)
+            continue
+
+        yield relative_path, scanned
+
+        # 逆序入栈，保证子目录按名称顺序深度优先遍历
+        for name in reversed(scanned.subdirs):
+            stack.append((os.path.join(relative_path, name), os.path.join(directory, name)))
@@ -0,0 +1,65 @@
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# 记录中保留的高频标签数量，完整的标签计数只保存在元数据索引中
+TOP_TAG_COUNT = 20
+
+# kohya 的数据集目录名通常带有 "重复次数_" 前缀，例如 "10_character"
+_REPEAT_PREFIX_RE = re.compile(r'^(\d+)_(.+)$')
+
+
+def normalize_tag(tag):
+    return ' '.join(str(tag).strip().lower().split())
+
+
+def _load_json_field(value, field):
+    if isinstance(value, dict):
+        return value
+    if not value:
+        return {}
+    try:
+        data = json.loads(value)
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Invalid {field} in safetensors metadata: {e}")
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def parse_tag_frequency(value):
+    """解析 ss_tag_frequency（{数据集目录: {标签: 次数}}），合并为 {标签: 总次数}"""
+    tags = {}
+    for dataset in _load_json_field(value, 'ss_tag_frequency').values():
+        if not isinstance(dataset, dict):
+            continue
+        for tag, count in dataset.items():
+            tag = normalize_tag(tag)
+            if not tag:
+                continue
+            try:
+                count = int(count)
+            except (TypeError, ValueError):
+                continue
+            tags[tag] = tags.get(tag, 0) + count
+    return tags
+
+
+def parse_dataset_dirs(value):
+    """解析 ss_dataset_dirs，返回 [{name, n_repeats, img_count}]，按目录名排序"""
+    dirs = []
+    for name, info in sorted(_load_json_field(value, 'ss_dataset_dirs').items()):
+        info = info if isinstance(info, dict) else {}
+        match = _REPEAT_PREFIX_RE.match(name)
+        dirs.append({
+            'name': match.group(2) if match else name,
+            'n_repeats': info.get('n_repeats', int(match.group(1)) if match else None),
+            'img_count': info.get('img_count'),
+        })
+    return dirs
+
+
+def top_tags(tags, limit=TOP_TAG_COUNT):
+    """按次数降序（同次数按标签名）返回前 limit 个标签名"""
+    return [tag for tag, _ in sorted(tags.items(), key=lambda item: (-item[1], item[0]))[:limit]]
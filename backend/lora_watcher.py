@@ -0,0 +1,170 @@
+import logging
+import os
+import threading
+import time
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog 是可选依赖，缺失时退回到轮询
+    FileSystemEventHandler = object
+    Observer = None
+
+logger = logging.getLogger(__name__)
+
+WATCHED_EXTS = ('.safetensors', '.png', '.json')
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.event_type not in ('created', 'deleted', 'moved', 'modified', 'closed'):
+            return
+        paths = [event.src_path]
+        if getattr(event, 'dest_path', None):
+            paths.append(event.dest_path)
+
+        for path in paths:
+            if isinstance(path, bytes):
+                path = os.fsdecode(path)
+            if event.is_directory:
+                # 目录内容变化会单独产生文件事件，这里只关心目录的增删和移动
+                if event.event_type != 'modified':
+                    self.watcher.mark_dirty(os.path.dirname(path))
+                    self.watcher.mark_dirty(path)
+            elif path.lower().endswith(WATCHED_EXTS):
+                self.watcher.mark_dirty(os.path.dirname(path))
+
+
+class LoraWatcher:
+    """监视 lora_path 下的文件变化，并按目录回调 on_change(相对路径)
+
+    优先使用 watchdog（inotify / ReadDirectoryChangesW 等系统通知），
+    未安装 watchdog 或启动失败时退回到轮询目录修改时间。
+    同一目录在 debounce 秒内的多次变化只会触发一次回调。
+    """
+
+    def __init__(self, base_path, on_change, poll_interval=1.0, debounce=0.3):
+        self.base_path = os.path.abspath(base_path)
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.mode = None
+        self._dirty = set()
+        self._last_event = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._observer = None
+        self._threads = []
+
+    def start(self):
+        if Observer is not None:
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_EventHandler(self), self.base_path, recursive=True)
+                self._observer.daemon = True
+                self._observer.start()
+                self.mode = 'watchdog'
+            except Exception as e:
+                logger.warning(f"Failed to start watchdog observer, falling back to polling: {e}")
+                self._observer = None
+
+        if self._observer is None:
+            self.mode = 'polling'
+            self._start_thread(self._poll_loop, 'lora-watcher-poll')
+
+        self._start_thread(self._dispatch_loop, 'lora-watcher-dispatch')
+        logger.info(f"Watching {self.base_path} for LoRA changes ({self.mode})")
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._observer is not None:
+            try:
+                self._observer.stop()
+            except Exception as e:
+                logger.error(f"Error stopping watchdog observer: {e}")
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def mark_dirty(self, directory):
+        """登记一个发生变化的目录（绝对路径）"""
+        directory = os.path.abspath(directory)
+        if directory != self.base_path and not directory.startswith(self.base_path + os.sep):
+            return
+        relative_path = os.path.relpath(directory, self.base_path)
+        if relative_path == '.':
+            relative_path = ''
+        with self._cond:
+            self._dirty.add(relative_path)
+            self._last_event = time.monotonic()
+            self._cond.notify_all()
+
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            with self._cond:
+                while not self._dirty and not self._stop.is_set():
+                    self._cond.wait()
+                if self._stop.is_set():
+                    return
+                # 等待事件平静下来，合并同一批变化
+                wait = self._last_event + self.debounce - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                dirty, self._dirty = self._dirty, set()
+
+            # 父目录优先，这样新建目录会先被登记再刷新其内容
+            for relative_path in sorted(dirty, key=lambda p: (p.count(os.sep), p)):
+                if self._stop.is_set():
+                    return
+                try:
+                    self.on_change(relative_path)
+                except Exception as e:
+                    logger.error(f"Error handling change in {relative_path or '/'}: {e}")
+
+    def _list_subdirs(self, directory):
+        try:
+            with os.scandir(directory) as it:
+                return [entry.path for entry in it if entry.is_dir()]
+        except OSError:
+            return []
+
+    def _track_tree(self, directory, known):
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            try:
+                known[current] = os.stat(current).st_mtime_ns
+            except OSError:
+                continue
+            stack.extend(self._list_subdirs(current))
+
+    def _poll_loop(self):
+        """轮询模式：目录中增删或重命名文件时目录的修改时间会改变"""
+        known = {}
+        self._track_tree(self.base_path, known)
+
+        while not self._stop.wait(self.poll_interval):
+            for directory, mtime in list(known.items()):
+                try:
+                    current = os.stat(directory).st_mtime_ns
+                except OSError:
+                    known.pop(directory, None)
+                    self.mark_dirty(os.path.dirname(directory))
+                    continue
+                if current == mtime:
+                    continue
+
+                known[directory] = current
+                self.mark_dirty(directory)
+                for subdir in self._list_subdirs(directory):
+                    if subdir not in known:
+                        self._track_tree(subdir, known)
@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, Response, g, jsonify, request, send_file, stream_with_context
 from flask_cors import CORS
 import logging
 import subprocess
@@ -6,11 +6,30 @@ import sys
 import os
 import json
 import re
-from safetensors import safe_open
 import uuid
 import time
 import base64
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from metadata_index import MetadataIndex, normalize_index_path
+from lora_library import LOAD_BATCH_SIZE, LoraLibrary, normalize_relative
+from lora_watcher import LoraWatcher
+from lora_query import LoraQuery, QueryError, parse_bool, parse_limit
+from click_store import ClickStore
+from config_service import ConfigService
+from safetensors_header import read_safetensors_metadata
+from thumbnails import ThumbnailCache
+from base_model_classifier import BaseModelClassifier
+from metrics import metrics, profiler
+from search_index import SearchIndex
+from lora_tags import normalize_tag, parse_tag_frequency, parse_dataset_dirs, top_tags
+from hash_service import HashService, DEFAULT_RATE_LIMIT_MB, MIN_HASH_PREFIX, normalize_hash
+from png_metadata import ImageMetadataCache
+from duplicates import find_duplicates
+from scan_jobs import ScanJobManager
+from event_bus import EventBus
+from wire_format import WireFormat, compress_response
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,11 +37,75 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    metrics.begin_request()
+
+@app.after_request
+def record_request_timing(response):
+    """记录请求耗时，并通过 Server-Timing 头返回各阶段耗时"""
+    start = g.pop('request_start', None)
+    stages = metrics.end_request()
+    if start is None:
+        return response
+    duration = time.perf_counter() - start
+    metrics.observe_request(request.endpoint or 'unknown', request.method, response.status_code, duration)
+    timings = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in stages.items()]
+    timings.append(f'total;dur={duration * 1000:.2f}')
+    response.headers['Server-Timing'] = ', '.join(timings)
+    return response
+
+# after_request 按注册的相反顺序执行，压缩耗时会计入上面的 Server-Timing
+@app.after_request
+def compress_json_response(response):
+    """按 Accept-Encoding 以 gzip / brotli 压缩 JSON、NDJSON 和 MessagePack 响应"""
+    with metrics.stage('compress'):
+        compress_response(response, request.accept_encodings)
+    return response
+
 CONFIG_PATH = os.path.join(os.path.dirname(
     os.path.abspath(__file__)), 'config.json')
 
+# 配置只在 POST /config 或文件被修改后重新读取
+config_service = ConfigService(CONFIG_PATH)
+
 CLICKS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clicks.json')
 
+# 点击量只在启动后读取一次，修改在内存中合并后定期写回 clicks.json
+click_store = ClickStore(CLICKS_PATH)
+
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lora_index.db')
+
+THUMBNAIL_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thumbnails')
+
+BASE_MODEL_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'base_model_rules.json')
+
+# 底模识别规则在启动时加载并预编译
+base_model_classifier = BaseModelClassifier.from_file(BASE_MODEL_RULES_PATH)
+
+# safetensors 头部解析结果的持久化索引，未变化的文件不会被再次打开；
+# 规则文件变化后索引自动重建
+metadata_index = MetadataIndex(INDEX_PATH, revision=base_model_classifier.fingerprint)
+
+# 后台计算 LoRA 文件哈希（SHA-256 / AutoV2 / WebUI 短哈希），结果存入元数据索引
+hash_service = HashService(metadata_index)
+
+# 预览图缩略图缓存，/preview 带 width 参数时返回缩略图
+thumbnail_cache = ThumbnailCache(THUMBNAIL_CACHE_PATH)
+
+# 图片生成参数的解析结果，按 (路径, 大小, 修改时间) 缓存
+image_metadata_cache = ImageMetadataCache()
+
+# 通过 /events（Server-Sent Events）向前端推送库的增量变化
+event_bus = EventBus()
+
+# 冷扫描时并发解析文件头的默认线程数（可通过 config.json 中的 scan_workers 修改）
+DEFAULT_SCAN_WORKERS = 8
+
+# 未安装 watchdog 时轮询目录变化的间隔（秒，可通过 config.json 中的 watch_interval 修改）
+DEFAULT_WATCH_INTERVAL = 1.0
+
 LORA_COMBINE_PATH = None
 
 def ensure_combine_path():
@@ -30,47 +113,18 @@ def ensure_combine_path():
     config = load_config()
     base_path = config.get('lora_path', '')
     LORA_COMBINE_PATH = os.path.join(base_path, 'LoraCombine')
-    if not os.path.exists(LORA_COMBINE_PATH):
-        os.makedirs(LORA_COMBINE_PATH)
+    os.makedirs(LORA_COMBINE_PATH, exist_ok=True)
 
 def load_config():
-    try:
-        if os.path.exists(CONFIG_PATH):
-            with open(CONFIG_PATH, 'r') as f:
-                return json.load(f)
-        return {"lora_path": ""}
-    except Exception as e:
-        logger.error(f"Error loading config: {e}")
-        return {"lora_path": ""}
+    """返回缓存的配置，只有 config.json 被修改后才重新解析"""
+    return config_service.get()
 
-def load_clicks():
-    try:
-        if os.path.exists(CLICKS_PATH):
-            with open(CLICKS_PATH, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                # 如果是旧格式，转换为新格式
-                if not isinstance(data, dict) or ('global' not in data and 'search' not in data):
-                    # 将旧数据迁移到新格式
-                    new_data = {
-                        "global": data if isinstance(data, dict) else {},
-                        "search": {}
-                    }
-                    # 保存新格式
-                    save_clicks(new_data)
-                    return new_data
-                return data
-        return {"global": {}, "search": {}}
-    except Exception as e:
-        logger.error(f"Error loading clicks: {e}")
-        return {"global": {}, "search": {}}
+def get_base_realpath():
+    """返回缓存的 lora_path realpath，用于校验请求路径"""
+    return config_service.base_realpath()
 
 def save_config(config):
-    with open(CONFIG_PATH, 'w') as f:
-        json.dump(config, f, indent=4)
-
-def save_clicks(clicks):
-    with open(CLICKS_PATH, 'w', encoding='utf-8') as f:
-        json.dump(clicks, f, indent=4, ensure_ascii=False)
+    config_service.save(config)
 
 @app.route('/config', methods=['GET'])
 def get_config():
@@ -80,9 +134,14 @@ def get_config():
 def update_config():
     try:
         config = load_config()
+        old_lora_path = config.get('lora_path', '')
         new_config = request.json
         config.update(new_config)
         save_config(config)
+        event_bus.publish('config_changed', {
+            'lora_path': config.get('lora_path', ''),
+            'lora_path_changed': config.get('lora_path', '') != old_lora_path
+        })
         return jsonify({"status": "success"})
     except Exception as e:
         logger.error(f"Error updating config: {e}")
@@ -123,7 +182,7 @@ def get_folders():
             return jsonify({'error': 'Path not found'}), 404
 
         # 确保不会访问基础路径以外的目录
-        if not os.path.realpath(current_path).startswith(os.path.realpath(base_path)):
+        if not os.path.realpath(current_path).startswith(get_base_realpath()):
             return jsonify({'error': 'Invalid path'}), 403
 
         # 获取文件夹列表并过滤掉 LoraCombine
@@ -141,90 +200,11 @@ def get_folders():
 
 def get_base_model_from_name(model_name):
     """从模型名称中提取基础模型信息"""
-    name = model_name.lower()
-    
-    # SDXL 模型系列
-    if any(x in name for x in ['xl', 'sdxl']):
-        # Illustrious 系列 - 添加更多匹配规则，包括 IL 前缀和后缀
-        if any(x in name for x in [
-            'illustrious', 'illust', 'illus-', 'illus_', '_ill', '_ill.',
-            'ill.safetensors', 'ill_', '-ill', 'il-', '-il', '_il',
-            'il.safetensors', 'il_', 'il.'
-        ]) or name.startswith(('il-', 'il_')) or name.endswith(('_il', '-il', '.il')):
-            return 'SDXL-Illustrious'
-        # Pony 系列
-        elif any(x in name for x in ['pony', 'animepastel', 'anime_pastel']):
-            return 'SDXL-AnimalPony'
-        # 其他 SDXL 变体
-        elif 'juggernaut' in name:
-            return 'SDXL-Juggernaut'
-        elif 'turbo' in name:
-            return 'SDXL-Turbo'
-        elif 'lightning' in name:
-            return 'SDXL-Lightning'
-        elif 'reborn' in name:
-            return 'SDXL-Reborn'
-    
-    # 检查特殊后缀和前缀，即使文件名中没有明确的 SDXL 标识
-    if (any(x in name for x in ['_ill', '_ill.', 'ill.safetensors', '_ill_', '-ill', 'il-', '-il', '_il']) or 
-        name.startswith(('il-', 'il_')) or 
-        name.endswith(('_il', '-il', '.il'))):
-        return 'SDXL-Illustrious'
-    
-    return None
+    return base_model_classifier.from_name(model_name)
 
 def get_base_model_from_comment(comment):
     """从训练注释中提取基础模型信息"""
-    comment = comment.lower()
-    
-    # SDXL 模型系列
-    if any(x in comment for x in ['xl', 'sdxl']):
-        # Pony 系列检查
-        if any(x in comment for x in [
-            'pony', 'animepastel', 'anime pastel', 'anime_pastel',
-            'animalspastel', 'animals pastel', 'animals_pastel'
-        ]):
-            return 'SDXL-AnimalPony'
-        
-        # Illustrious 系列检查
-        elif any(x in comment for x in [
-            'illustrious', 'illust', 'illus-', 'illus_',
-            'illustr-', 'illustr_', 'illustrated'
-        ]):
-            return 'SDXL-Illustrious'
-        
-        # 其他 SDXL 变体
-        elif 'juggernaut' in comment:
-            return 'SDXL-Juggernaut'
-        elif 'turbo' in comment:
-            return 'SDXL-Turbo'
-        elif 'lightning' in comment:
-            return 'SDXL-Lightning'
-        elif 'reborn' in comment:
-            return 'SDXL-Reborn'
-        elif any(x in comment for x in ['base', 'basic', 'original']):
-            return 'SDXL-Base'
-        return 'SDXL'
-    
-    # SD 1.5 系列
-    elif any(x in comment for x in ['sd15', 'sd1.5', 'sd 1.5']):
-        if 'anything' in comment:
-            if 'v4.5' in comment:
-                return 'SD1.5-AnythingV4.5'
-            elif 'v5' in comment:
-                return 'SD1.5-AnythingV5'
-            return 'SD1.5-Anything'
-        elif 'vae' in comment:
-            return 'SD1.5-VAE'
-        return 'SD1.5'
-    
-    # SD 2.x 系列
-    elif 'sd21' in comment or 'sd2.1' in comment:
-        return 'SD2.1'
-    elif 'sd20' in comment or 'sd2.0' in comment:
-        return 'SD2.0'
-    
-    return None
+    return base_model_classifier.from_comment(comment)
 
 def get_file_info(file_path):
     """获取文件的创建时间和修改时间"""
@@ -236,103 +216,98 @@ def get_file_info(file_path):
 
 def get_lora_metadata(file_path):
     try:
-        with safe_open(file_path, framework="pt") as f:
-            metadata = f.metadata()
-            
-            base_model = None
-            model_info = []
-            model_scores = {}  # 用于存储每个模型类型的可信度分数
-            
-            file_name = os.path.basename(file_path)
-            file_path_lower = file_path.lower()
-            dir_name = os.path.basename(os.path.dirname(file_path)).lower()
-            
-            # 1. 首先检查训练注释（最高优先级）
-            if 'ss_training_comment' in metadata:
-                comment = metadata['ss_training_comment'].lower()
-                # Pony检查
-                if any(x in comment for x in [
-                    'pony', 'animepastel', 'anime pastel', 'anime_pastel',
-                    'animalspastel', 'animals pastel', 'animals_pastel'
-                ]):
-                    model_scores['SDXL-AnimalPony'] = 100
-                # Illustrious检查
-                elif any(x in comment for x in [
-                    'illustrious', 'illust', 'illus', 'illustrated'
-                ]):
-                    model_scores['SDXL-Illustrious'] = 100
-            
-            # 2. 检查模型名称（第二优先级）
-            if 'ss_sd_model_name' in metadata:
-                model_name = metadata['ss_sd_model_name'].lower()
-                if 'pony' in model_name or 'animepastel' in model_name:
-                    model_scores['SDXL-AnimalPony'] = model_scores.get('SDXL-AnimalPony', 0) + 80
-                elif 'illustrious' in model_name:
-                    model_scores['SDXL-Illustrious'] = model_scores.get('SDXL-Illustrious', 0) + 80
-            
-            # 3. 检查目录路径（第三优先级）
-            # 使用正则表达式查找完整的目录名，而不是简单的字符串匹配
-            path_parts = file_path_lower.split(os.sep)
-            for part in path_parts:
-                if re.match(r'.*pony.*', part) or re.match(r'.*animal.*pastel.*', part):
-                    model_scores['SDXL-AnimalPony'] = model_scores.get('SDXL-AnimalPony', 0) + 60
-                elif re.match(r'.*illustrious.*', part) or re.match(r'.*illust.*', part):
-                    model_scores['SDXL-Illustrious'] = model_scores.get('SDXL-Illustrious', 0) + 60
-            
-            # 4. 最后检查文件名（最低优先级）
-            if not model_scores.get('SDXL-AnimalPony', 0) > 0:  # 只在没有找到Pony的情况下检查其他模式
-                name_lower = file_name.lower()
-                if any(x in name_lower for x in [
-                    'illustrious', 'illust', 'illus-', 'illus_', '_ill', '_ill.',
-                    'ill.safetensors', 'ill_', '-ill', 'il-', '-il', '_il'
-                ]):
-                    model_scores['SDXL-Illustrious'] = model_scores.get('SDXL-Illustrious', 0) + 40
-            
-            # 5. 从 base_model_version 获取基本信息
-            if 'ss_base_model_version' in metadata:
-                version = metadata['ss_base_model_version']
-                if version:
-                    if 'sdxl_base_v1-0' in version.lower():
-                        # 使用已经收集的信息来决定具体的模型类型
-                        highest_score = max(model_scores.values()) if model_scores else 0
-                        if (highest_score > 0):
-                            base_model = max(model_scores.items(), key=lambda x: x[1])[0]
-                        else:
-                            base_model = 'SDXL-Base'
-                    model_info.append(version)
-            
-            # 6. 如果没有找到任何匹配，但有分数记录，选择分数最高的
-            if not base_model and model_scores:
-                base_model = max(model_scores.items(), key=lambda x: x[1])[0]
-            
-            # 如果仍然没有找到，使用默认值
-            if not base_model:
-                base_model = 'Unknown'
-            
-            # 打印调试信息
-            if model_scores:
-                logger.info(f"Model scores for {file_name}: {model_scores}")
-
-            # 获取文件时间信息
-            file_times = get_file_info(file_path)
+        with metrics.stage('header_read'):
+            metadata = read_safetensors_metadata(file_path)
+        
+        file_name = os.path.basename(file_path)
 
-            return {
-                'ss_base_model_version': metadata.get('ss_base_model_version', 'Unknown'),
-                'ss_network_module': metadata.get('ss_network_module', ''),
-                'ss_network_dim': metadata.get('ss_network_dim', ''),
-                'ss_network_alpha': metadata.get('ss_network_alpha', ''),
-                'ss_training_comment': metadata.get('ss_training_comment', ''),
-                'base_model': base_model,
-                'model_info': model_info,
-                'model_scores': model_scores,  # 可选：添加分数信息用于调试
-                'created_time': file_times['created_time'],  # 添加创建时间
-                'modified_time': file_times['modified_time']  # 添加修改时间
-            }
+        # 按规则表（base_model_rules.json）为各底模打分并确定底模
+        with metrics.stage('classification'):
+            base_model, model_info, model_scores = base_model_classifier.classify(metadata, file_path)
+        
+        # 打印调试信息
+        if model_scores:
+            logger.info(f"Model scores for {file_name}: {model_scores}")
+
+        # 训练标签：完整计数写入索引的标签表，记录中只保留高频标签
+        with metrics.stage('tag_parse'):
+            tags = parse_tag_frequency(metadata.get('ss_tag_frequency'))
+            dataset_dirs = parse_dataset_dirs(metadata.get('ss_dataset_dirs'))
+
+        # 获取文件时间信息
+        file_times = get_file_info(file_path)
+
+        return {
+            'ss_base_model_version': metadata.get('ss_base_model_version', 'Unknown'),
+            'ss_network_module': metadata.get('ss_network_module', ''),
+            'ss_network_dim': metadata.get('ss_network_dim', ''),
+            'ss_network_alpha': metadata.get('ss_network_alpha', ''),
+            'ss_training_comment': metadata.get('ss_training_comment', ''),
+            'base_model': base_model,
+            'model_info': model_info,
+            'model_scores': model_scores,  # 可选：添加分数信息用于调试
+            'top_tags': top_tags(tags),
+            'dataset_dirs': dataset_dirs,
+            'created_time': file_times['created_time'],  # 添加创建时间
+            'modified_time': file_times['modified_time'],  # 添加修改时间
+            'tags': tags  # 由 resolve_lora_metadata 写入标签表后移除
+        }
 
     except Exception as e:
         logger.error(f"Error reading safetensors metadata: {e}")
         return {}
 
+def get_scan_workers():
+    """获取并发解析文件头的线程数"""
+    try:
+        workers = int(load_config().get('scan_workers', DEFAULT_SCAN_WORKERS))
+    except (TypeError, ValueError):
+        workers = DEFAULT_SCAN_WORKERS
+    return max(1, workers)
+
+def resolve_lora_metadata(entries):
+    """批量获取 LoRA 元数据
+
+    优先从持久化索引读取，只有新增或修改过的文件才重新解析；
+    未命中的文件通过线程池并发读取文件头，返回顺序与输入一致。
+    """
+    results = [None] * len(entries)
+    missing = []
+    with metrics.stage('index_lookup'):
+        for i, entry in enumerate(entries):
+            try:
+                cached = metadata_index.get(entry.path, entry.stat.st_size, entry.stat.st_mtime_ns)
+            except Exception as e:
+                logger.error(f"Error reading metadata index for {entry.path}: {e}")
+                cached = None
+            if cached is not None:
+                results[i] = cached
+            else:
+                missing.append(i)
+    metrics.inc('metadata_index_hits', len(entries) - len(missing))
+    metrics.inc('metadata_index_misses', len(missing))
+
+    if not missing:
+        return results
+
+    paths = [entries[i].path for i in missing]
+    workers = min(get_scan_workers(), len(missing))
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='lora-scan') as executor:
+            parsed = list(executor.map(get_lora_metadata, paths))
+    else:
+        parsed = [get_lora_metadata(path) for path in paths]
+
+    for i, metadata in zip(missing, parsed):
+        tags = metadata.pop('tags', None)
+        results[i] = metadata
+        # 解析失败的结果不写入索引，下次扫描时重试
+        if metadata:
+            stat = entries[i].stat
+            metadata_index.put(entries[i].path, stat.st_size, stat.st_mtime_ns, metadata, tags)
+    metadata_index.flush()
+    return results
+
 # 添加预设的基础模型列表
 BASE_MODELS = [
     'SDXL-Base',
@@ -365,11 +340,222 @@ def get_lora_config(file_path):
         logger.error(f"Error reading lora config: {e}")
         return {}
 
+def build_lora_info(entry, relative_path, metadata):
+    """根据扫描到的目录项构建 LoRA 信息"""
+    # 获取或创建空的配置数据
+    config_data = {}
+    if entry.config_file:
+        config_path = os.path.join(os.path.dirname(entry.path), entry.config_file)
+        with metrics.stage('sidecar_load'):
+            config_data = get_lora_config(config_path)
+
+    return {
+        'name': entry.name,
+        'base_name': entry.base_name,
+        'has_preview': bool(entry.preview_file),
+        'has_config': bool(entry.config_file),
+        'preview_path': versioned_url(f'/preview?path={relative_path}&file={entry.preview_file}',
+                                      stat=entry.preview_stat) if entry.preview_file else None,
+        'metadata': metadata,
+        'config': config_data,  # 即使没有配置文件也返回空对象
+        'relative_path': relative_path  # 添加相对路径信息
+    }
+
+def build_library_records(items):
+    """为 LoRA 库批量构建记录，items 为 [(相对路径, LoraEntry)]"""
+    metadata_list = resolve_lora_metadata([entry for _, entry in items])
+    return [build_lora_info(entry, relative_path, metadata)
+            for (relative_path, entry), metadata in zip(items, metadata_list)]
+
+# 内存中的 LoRA 库，列表类接口只做内存查找，由文件监视器增量更新
+lora_library = LoraLibrary(build_library_records)
+lora_watcher = None
+library_lock = threading.Lock()
+
+# LoRA 全文搜索索引，库内容变化后在下一次搜索时重建
+search_index = SearchIndex()
+
+def library_is_ready(base_path):
+    return lora_library.loaded and lora_library.base_path == base_path
+
+def chunk_records(records):
+    """把记录列表按 LOAD_BATCH_SIZE 分批"""
+    return (records[i:i + LOAD_BATCH_SIZE] for i in range(0, len(records), LOAD_BATCH_SIZE))
+
+def load_library(job):
+    """扫描任务的执行体：按 job.key 完整加载 LoRA 库，逐批产出记录
+
+    在任务线程中运行，不受客户端读取速度影响，可以在整个扫描期间持有 library_lock；
+    旧的文件监视器继续运行，扫描期间的变化由 iter_load 补上。
+    """
+    with library_lock:
+        if library_is_ready(job.key) and not job.refresh:
+            yield from chunk_records(lora_library.all_records())
+            return
+        reloaded = lora_library.loaded
+        complete = yield from lora_library.iter_load(job.key, on_scan=job.on_scan)
+        stop_library_watcher()
+        finish_library_load(job.key, complete, reloaded)
+
+# 后台扫描任务：同一个 lora_path 同时只运行一次扫描，请求方断开后扫描继续进行；
+# 所有完整加载都通过扫描任务进行，并发的请求加入同一个任务
+scan_jobs = ScanJobManager(load_library)
+
+def start_library_load(base_path, reload=False):
+    """启动或加入 base_path 的扫描任务"""
+    while True:
+        job, _ = scan_jobs.start(base_path, reload)
+        # 需要重新扫描时不加入只返回已加载数据的任务，等它结束后再启动新的任务
+        if not reload or job.refresh or not library_is_ready(base_path):
+            return job
+        job.wait()
+
+def check_library_job(job):
+    if job.state != 'completed':
+        raise RuntimeError(job.error or f'Library scan {job.state}')
+
+def ensure_library(base_path, reload=False):
+    """确保 LoRA 库已按当前 lora_path 加载，并启动文件监视"""
+    # 库已加载时不等待：重新扫描期间其他请求继续使用旧数据，扫描完成后才整体替换
+    if library_is_ready(base_path) and not reload:
+        return lora_library
+    job = start_library_load(base_path, reload)
+    job.wait()
+    check_library_job(job)
+    return lora_library
+
+def iter_library_batches(base_path, reload=False):
+    """逐批产出 LoRA 记录列表，库未加载时加入扫描任务，边扫描边产出"""
+    if reload or not library_is_ready(base_path):
+        # 从任务中读取记录，读取缓慢的客户端不会拖慢扫描本身
+        job = start_library_load(base_path, reload)
+        state = yield from job.follow()
+        check_library_job(job)
+        if state is not None:
+            return
+        # 任务在开始读取前已经结束并释放了记录，改为读取加载好的库
+    yield from chunk_records(lora_library.all_records())
+
+def stop_library_watcher():
+    global lora_watcher
+    if lora_watcher is not None:
+        lora_watcher.stop()
+        lora_watcher = None
+
+def finish_library_load(base_path, complete, reloaded=False):
+    """完整扫描结束后清理索引并启动文件监视，reloaded 表示替换了已加载的库"""
+    global lora_watcher
+    # 完整扫描成功后清理索引中已删除的文件
+    if complete:
+        metadata_index.prune(base_path, lora_library.lora_paths())
+
+    config = load_config()
+    if config.get('watch_library', True):
+        try:
+            interval = float(config.get('watch_interval', DEFAULT_WATCH_INTERVAL))
+        except (TypeError, ValueError):
+            interval = DEFAULT_WATCH_INTERVAL
+        lora_watcher = LoraWatcher(base_path, on_library_change, poll_interval=interval)
+        lora_watcher.start()
+
+    schedule_hashing(lora_library.lora_paths())
+
+    # 重新扫描后的变化无法逐条列出，通知客户端重新加载完整列表
+    if reloaded:
+        event_bus.publish('library_reloaded', {
+            'base_path': base_path,
+            'epoch': lora_library.epoch,
+            'version': lora_library.generation
+        })
+
+def schedule_hashing(paths):
+    """把 LoRA 文件加入后台哈希队列（可通过 config.json 中的 hash_loras 关闭）"""
+    config = load_config()
+    if not config.get('hash_loras', True):
+        return
+    try:
+        hash_service.rate_limit_mb = float(config.get('hash_rate_limit_mb', DEFAULT_RATE_LIMIT_MB))
+    except (TypeError, ValueError):
+        hash_service.rate_limit_mb = DEFAULT_RATE_LIMIT_MB
+    hash_service.enqueue(paths)
+
+def on_library_change(relative_path):
+    """文件监视器回调：增量刷新发生变化的目录"""
+    changes = lora_library.refresh_directory(relative_path)
+    for path in changes.removed_paths:
+        metadata_index.remove(path)
+    metadata_index.flush()
+    if changes:
+        logger.info(f"Library updated in {relative_path or '/'}: {changes}")
+        publish_library_changes(changes)
+    # 同一秒内修改的文件记录可能没有变化，因此整个目录重新入队，未变化的文件会直接跳过
+    records = (lora_library.directory_records(relative_path) or []) + changes.added
+    schedule_hashing(os.path.join(lora_library.base_path, record['relative_path'], record['name'])
+                     for record in records)
+    return changes
+
+def lora_event_info(record):
+    """事件中的 LoRA 信息与 /lora-files 返回的格式一致"""
+    return add_click_count_to_lora_info(process_lora_info(dict(record)))
+
+def publish_library_changes(changes):
+    # version 与 /lora-files/changes 的版本号一致，客户端据此记录已同步到的版本
+    version = {'epoch': lora_library.epoch, 'version': changes.generation}
+    if changes.added:
+        event_bus.publish('lora_added', {'loras': [lora_event_info(r) for r in changes.added], **version})
+    if changes.updated:
+        event_bus.publish('lora_updated', {'loras': [lora_event_info(r) for r in changes.updated], **version})
+    if changes.removed:
+        event_bus.publish('lora_removed', {
+            'loras': [{'name': r['name'], 'relative_path': r['relative_path']} for r in changes.removed],
+            **version
+        })
+
+def refresh_library_path(directory):
+    """处理完修改文件的请求后立即刷新对应目录，不等待文件监视器"""
+    if not lora_library.loaded or not lora_library.base_path:
+        return
+    try:
+        base_real = os.path.realpath(lora_library.base_path)
+        relative_path = os.path.relpath(os.path.realpath(directory), base_real)
+        if relative_path == '.':
+            relative_path = ''
+        elif relative_path.startswith('..'):
+            return
+        on_library_change(relative_path)
+    except Exception as e:
+        logger.error(f"Error refreshing library for {directory}: {e}")
+
 @app.route('/base-models', methods=['GET'])
 def get_base_models():
     """获取预设的基础模型列表"""
     return jsonify(BASE_MODELS)
 
+def render_lora_listing(result, wire, keys=('lora_files',)):
+    """按 fields / compact / layout / format 参数输出包含 LoRA 列表的结果
+
+    wire 为 None 时保持原有的 JSON 格式；keys 为结果中需要转换的记录列表。
+    """
+    with metrics.stage('serialize'):
+        if wire is None:
+            return jsonify(result)
+        for key in keys:
+            result[key] = wire.records(result[key])
+        return Response(wire.dumps(result), mimetype=wire.mimetype)
+
+def process_lora_info(lora_info):
+    # 如果配置中标记为兼容 Illustrious，添加到元数据中
+    if lora_info.get('config', {}).get('works_in_illustrious'):
+        # 复制一份再修改，避免改动库中缓存的记录
+        metadata = dict(lora_info.get('metadata') or {})
+        model_info = list(metadata.get('model_info', []))
+        # 添加 Illustrious 到 model_info 列表中
+        if 'SDXL-Illustrious' not in model_info:
+            model_info.append('SDXL-Illustrious')
+        metadata['model_info'] = model_info
+        lora_info['metadata'] = metadata
+    return lora_info
+
 @app.route('/lora-files', methods=['GET'])
 def get_lora_files():
     try:
@@ -384,67 +570,83 @@ def get_lora_files():
         if not os.path.exists(current_path):
             return jsonify({'error': 'Path not found'}), 404
 
-        if not os.path.realpath(current_path).startswith(os.path.realpath(base_path)):
+        if not os.path.realpath(current_path).startswith(get_base_realpath()):
             return jsonify({'error': 'Invalid path'}), 403
 
-        lora_files = []
-        files = os.listdir(current_path)
+        wire = WireFormat.from_args(request.args)
 
-        def process_lora_info(lora_info):
-            # 如果配置中标记为兼容 Illustrious，添加到元数据中
-            if lora_info.get('config', {}).get('works_in_illustrious'):
-                if 'metadata' not in lora_info:
-                    lora_info['metadata'] = {}
-                # 添加 Illustrious 到 model_info 列表中
-                if 'model_info' not in lora_info['metadata']:
-                    lora_info['metadata']['model_info'] = []
-                if 'SDXL-Illustrious' not in lora_info['metadata']['model_info']:
-                    lora_info['metadata']['model_info'].append('SDXL-Illustrious')
-            return lora_info
-
-        for file in files:
-            if file.endswith('.safetensors'):
-                base_name = file[:-11]
-                full_path = os.path.join(current_path, file)
-
-                metadata = get_lora_metadata(full_path)
-
-                # 检查相关文件
-                preview_file = next((f for f in files if f.startswith(
-                    base_name) and f.endswith('.png')), None)
-                config_file = next((f for f in files if f.startswith(
-                    base_name) and f.endswith('.json')), None)
-
-                # 获取或创建空的配置数据
-                config_data = {}
-                if config_file:
-                    config_path = os.path.join(current_path, config_file)
-                    config_data = get_lora_config(config_path)
-
-                lora_info = {
-                    'name': file,
-                    'base_name': base_name,
-                    'has_preview': bool(preview_file),
-                    'has_config': bool(config_file),
-                    'preview_path': f'/preview?path={sub_path}&file={preview_file}' if preview_file else None,
-                    'metadata': metadata,
-                    'config': config_data  # 即使没有配置文件也返回空对象
-                }
-                
+        # 从内存中的 LoRA 库直接读取，目录尚未登记时单独刷新一次
+        library = ensure_library(base_path)
+        relative_path = normalize_relative(sub_path)
+        records = library.directory_records(relative_path)
+        if records is None or request.args.get('refresh'):
+            library.refresh_directory(relative_path)
+            records = library.directory_records(relative_path) or []
+
+        lora_files = []
+        with metrics.stage('click_merge'):
+            for record in records:
                 # 处理 Illustrious 兼容信息
-                lora_info = process_lora_info(lora_info)
+                lora_info = process_lora_info(dict(record))
                 lora_info = add_click_count_to_lora_info(lora_info)
                 lora_files.append(lora_info)
 
-        return jsonify({
+        result = {
             'lora_files': lora_files,
             'current_path': sub_path or '/'
-        })
+        }
+
+        # 带分页/排序/筛选参数时只返回当前页
+        query = LoraQuery.from_args(request.args)
+        if query:
+            result['lora_files'], result['next_cursor'], result['total'] = query.apply(lora_files)
+
+        return render_lora_listing(result, wire)
 
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error scanning lora files: {e}")
         return jsonify({'error': str(e)}), 500
 
+# 带版本号的图片 URL 内容不会变化，允许浏览器长期缓存
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+def file_version(stat):
+    """根据修改时间和文件大小生成图片的版本号"""
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
+def versioned_url(url, file_path=None, stat=None):
+    """在图片 URL 后附加版本号，文件变化后 URL 随之变化"""
+    try:
+        if stat is None:
+            stat = os.stat(file_path)
+    except (OSError, TypeError):
+        return url
+    separator = '&' if '?' in url else '?'
+    return f'{url}{separator}v={file_version(stat)}'
+
+def send_cached_image(file_path, mimetype, source_stat=None, variant=''):
+    """发送图片，支持 ETag / Last-Modified 条件请求
+
+    source_stat 为原图的状态（发送缩略图时与实际文件不同），用于生成校验值；
+    请求带有与当前文件一致的版本号 v 时返回长期不可变缓存头。
+    """
+    stat = source_stat or os.stat(file_path)
+    version = file_version(stat)
+    versioned = request.args.get('v') == version
+    response = send_file(
+        file_path,
+        mimetype=mimetype,
+        etag=version + variant,
+        last_modified=stat.st_mtime,
+        max_age=IMMUTABLE_MAX_AGE if versioned else 0,
+        conditional=True
+    )
+    if versioned:
+        response.cache_control.immutable = True
+    return response
+
 @app.route('/preview', methods=['GET'])
 def get_preview():
     try:
@@ -461,12 +663,32 @@ def get_preview():
         if not os.path.exists(file_path):
             return jsonify({'error': 'File not found'}), 404
 
-        return send_file(file_path, mimetype='image/png')
+        if not os.path.realpath(file_path).startswith(get_base_realpath()):
+            return jsonify({'error': 'Invalid path'}), 403
+
+        # 网格视图请求缩略图，未安装 Pillow 或原图已经足够小时返回原图
+        width = request.args.get('width', type=int)
+        if width and width > 0 and thumbnail_cache.available:
+            thumbnail_path = thumbnail_cache.get(file_path, width)
+            if thumbnail_path:
+                return send_cached_image(thumbnail_path, thumbnail_cache.mimetype,
+                                         source_stat=os.stat(file_path),
+                                         variant=f'-w{thumbnail_cache.snap_width(width)}')
+
+        return send_cached_image(file_path, 'image/png')
 
     except Exception as e:
         logger.error(f"Error sending preview: {e}")
         return jsonify({'error': str(e)}), 500
 
+def list_preview_urls(directory, sub_path, lora_name, files=None):
+    """列出目录中属于该 LoRA 的全部预览图（名称.png、名称_1.png ...），files 为已读取的目录列表"""
+    if files is None:
+        files = os.listdir(directory)
+    preview_pattern = re.compile(f'^{re.escape(lora_name)}(_\\d+)?\\.png$')
+    return sorted(versioned_url(f'/preview?path={sub_path}&file={f}', os.path.join(directory, f))
+                  for f in files if preview_pattern.match(f))
+
 @app.route('/previews', methods=['GET'])
 def get_previews():
     try:
@@ -482,14 +704,7 @@ def get_previews():
 
         current_path = os.path.join(base_path, sub_path) if sub_path else base_path
         
-        # 获取当前目录下所有文件
-        files = os.listdir(current_path)
-        
-        # 找出所有匹配的预览图
-        preview_pattern = re.compile(f'^{re.escape(lora_name)}(_\\d+)?\\.png$')
-        previews = [f'/preview?path={sub_path}&file={f}' for f in files if preview_pattern.match(f)]
-        
-        return jsonify({'previews': sorted(previews)})
+        return jsonify({'previews': list_preview_urls(current_path, sub_path, lora_name)})
 
     except Exception as e:
         logger.error(f"Error getting previews: {e}")
@@ -521,7 +736,7 @@ def upload_preview():
         if not os.path.exists(current_path):
             return jsonify({'error': 'Target directory not found'}), 404
             
-        if not os.path.realpath(current_path).startswith(os.path.realpath(base_path)):
+        if not os.path.realpath(current_path).startswith(get_base_realpath()):
             return jsonify({'error': 'Invalid path'}), 403
 
         # 获取当前目录下所有预览图数量并找到最大编号
@@ -541,6 +756,12 @@ def upload_preview():
         
         logger.info(f"Saving preview to: {file_path}")
         file.save(file_path)
+        refresh_library_path(current_path)
+        event_bus.publish('preview_added', {
+            'name': lora_name,
+            'relative_path': normalize_relative(sub_path),
+            'filename': new_filename
+        })
 
         return jsonify({
             'status': 'success',
@@ -602,6 +823,7 @@ def update_lora_config():
                 json.dump(config_data, f, indent=4, ensure_ascii=False)
             
             logger.info(f"Successfully saved config to: {config_path}")
+            refresh_library_path(current_path)
             
             return jsonify({
                 'status': 'success',
@@ -681,6 +903,12 @@ def swap_preview():
         os.rename(main_preview_path, temp_preview_path)
         os.rename(target_preview_path, main_preview_path)
         os.rename(temp_preview_path, target_preview_path)
+        refresh_library_path(current_path)
+        event_bus.publish('preview_swapped', {
+            'name': lora_name,
+            'relative_path': normalize_relative(sub_path),
+            'preview_index': preview_index
+        })
 
         return jsonify({'status': 'success'})
 
@@ -703,57 +931,623 @@ def scan_all_loras():
         if not base_path or not os.path.exists(base_path):
             return jsonify({'error': 'Invalid base path'}), 404
 
-        all_lora_files = []
         search_term = normalize_search_term(request.args.get('search_term'))  # 添加搜索词参数
+        reload = bool(request.args.get('refresh'))
+        wire = WireFormat.from_args(request.args)
+
+        # 流式模式：每解析出一个 LoRA 就输出一行 JSON（NDJSON），
+        # 最后一行为 {"done": true, "epoch", "version"}，供 /lora-files/changes 增量同步；
+        # layout=columns 时第一行为 {"columns": [...]}，之后每行是一个数组
+        if request.args.get('stream'):
+            if wire is None:
+                dumps_item = lambda value: (json.dumps(value, ensure_ascii=False) + '\n').encode('utf-8')
+            else:
+                dumps_item = wire.dumps_item
+
+            def generate():
+                try:
+                    # 库已加载时先读取版本号，之后的变化会在增量同步中再次返回
+                    version = library_version() if library_is_ready(base_path) and not reload else None
+                    if wire is not None and wire.stream_header() is not None:
+                        yield dumps_item(wire.stream_header())
+                    # 每批记录合并为一块输出，启用压缩时每块之后刷新，客户端收到即可解出这一批
+                    for batch in iter_library_batches(base_path, reload):
+                        chunk = []
+                        for record in batch:
+                            lora_info = add_click_count_to_lora_info(dict(record), search_term)
+                            chunk.append(dumps_item(wire.stream_record(lora_info) if wire else lora_info))
+                        yield b''.join(chunk)
+                    yield dumps_item({'done': True, **(version or library_version())})
+                except Exception as e:
+                    logger.error(f"Error streaming lora files: {e}")
+                    yield dumps_item({'error': str(e)})
+
+            mimetype = wire.stream_mimetype if wire else 'application/x-ndjson'
+            return Response(stream_with_context(generate()), mimetype=mimetype)
+
+        # 已加载的库直接返回内存中的结果，refresh 参数强制重新完整扫描
+        library = ensure_library(base_path, reload=reload)
+        version = library_version()
+
+        with metrics.stage('click_merge'):
+            all_lora_files = [add_click_count_to_lora_info(dict(record), search_term)
+                              for record in library.all_records()]
+
+        result = {
+            'lora_files': all_lora_files,
+            **version
+        }
 
-        def scan_directory(directory, relative_path=''):
-            try:
-                for item in os.listdir(directory):
-                    full_path = os.path.join(directory, item)
-                    item_relative_path = os.path.join(relative_path, item)
-
-                    if os.path.isdir(full_path):
-                        # 递归扫描子目录
-                        scan_directory(full_path, item_relative_path)
-                    elif item.endswith('.safetensors'):
-                        # 处理 LoRA 文件
-                        base_name = item[:-11]
-                        metadata = get_lora_metadata(full_path)
-
-                        # 检查相关文件
-                        preview_file = next((f for f in os.listdir(directory) if f.startswith(base_name) and f.endswith('.png')), None)
-                        config_file = next((f for f in os.listdir(directory) if f.startswith(base_name) and f.endswith('.json')), None)
-
-                        # 获取配置数据
-                        config_data = {}
-                        if config_file:
-                            config_path = os.path.join(directory, config_file)
-                            config_data = get_lora_config(config_path)
-
-                        lora_info = {
-                            'name': item,
-                            'base_name': base_name,
-                            'has_preview': bool(preview_file),
-                            'has_config': bool(config_file),
-                            'preview_path': f'/preview?path={relative_path}&file={preview_file}' if preview_file else None,
-                            'metadata': metadata,
-                            'config': config_data,
-                            'relative_path': relative_path  # 添加相对路径信息
-                        }
-                        lora_info = add_click_count_to_lora_info(lora_info, search_term)
-                        all_lora_files.append(lora_info)
-            except Exception as e:
-                logger.error(f"Error scanning directory {directory}: {e}")
+        # 带分页/排序/筛选参数时只返回当前页
+        query = LoraQuery.from_args(request.args)
+        if query:
+            result['lora_files'], result['next_cursor'], result['total'] = query.apply(all_lora_files)
 
-        # 开始递归扫描
-        scan_directory(base_path)
-        
+        return render_lora_listing(result, wire)
+
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error scanning all lora files: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def library_version():
+    return {'epoch': lora_library.epoch, 'version': lora_library.generation}
+
+@app.route('/lora-files/changes', methods=['GET'])
+def get_lora_file_changes():
+    """返回版本 since 之后新增、修改和删除的 LoRA
+
+    epoch 和 since 来自 /scan-all-loras 的结果或 /events 事件；epoch 不一致（库被重新
+    完整扫描或服务重启）或 since 超出变更日志的保留范围时返回 full_resync，
+    客户端需要重新加载完整列表。
+    """
+    try:
+        config = load_config()
+        base_path = config.get('lora_path', '')
+
+        if not base_path or not os.path.exists(base_path):
+            return jsonify({'error': 'Invalid base path'}), 404
+
+        since = request.args.get('since', type=int)
+        if since is None:
+            return jsonify({'error': 'Missing since'}), 400
+        wire = WireFormat.from_args(request.args)
+
+        library = ensure_library(base_path)
+        result = {'since': since, **library_version(), 'full_resync': True}
+        changes = library.changes_since(since) if request.args.get('epoch') == library.epoch else None
+        if changes is None:
+            return render_lora_listing(result, wire, keys=())
+
+        version, added, updated, removed = changes
+        result.update({
+            'version': version,
+            'full_resync': False,
+            'added': [lora_event_info(record) for record in added],
+            'updated': [lora_event_info(record) for record in updated],
+            'removed': [{'name': r['name'], 'relative_path': r['relative_path']} for r in removed]
+        })
+        return render_lora_listing(result, wire, keys=('added', 'updated'))
+
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting lora file changes: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/scan-jobs', methods=['POST'])
+def start_scan_job():
+    """启动后台扫描，已有扫描在运行时返回该任务；refresh 为真时强制重新完整扫描"""
+    try:
+        config = load_config()
+        base_path = config.get('lora_path', '')
+
+        if not base_path or not os.path.exists(base_path):
+            return jsonify({'error': 'Invalid base path'}), 404
+
+        data = request.get_json(silent=True) or {}
+        refresh = data.get('refresh', request.args.get('refresh'))
+        refresh = parse_bool(refresh) if isinstance(refresh, str) and refresh else bool(refresh)
+        job, created = scan_jobs.start(base_path, refresh)
+        return jsonify({'job': job.to_dict(), 'created': created}), 202 if created else 200
+
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error starting scan job: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/scan-jobs', methods=['GET'])
+def list_scan_jobs():
+    return jsonify({'jobs': [job.to_dict() for job in scan_jobs.list()]})
+
+@app.route('/scan-jobs/<job_id>', methods=['GET'])
+def get_scan_job(job_id):
+    job = scan_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job': job.to_dict()})
+
+@app.route('/scan-jobs/<job_id>', methods=['DELETE'])
+def cancel_scan_job(job_id):
+    """取消扫描任务，已加载的库数据保持不变"""
+    job = scan_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job': job.to_dict()})
+
+DEFAULT_SEARCH_LIMIT = 50
+
+@app.route('/search', methods=['GET'])
+def search_loras():
+    """按文件名、触发词、描述和训练注释搜索 LoRA，结合该搜索词的点击量排序"""
+    try:
+        config = load_config()
+        base_path = config.get('lora_path', '')
+
+        if not base_path or not os.path.exists(base_path):
+            return jsonify({'error': 'Invalid base path'}), 404
+
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'Missing query'}), 400
+        limit = parse_limit(request.args, DEFAULT_SEARCH_LIMIT)
+
+        library = ensure_library(base_path)
+        with metrics.stage('search_index'):
+            search_index.ensure(library.generation, library.all_records)
+
+        search_term = normalize_search_term(query)
+        with metrics.stage('search'):
+            matches, total = search_index.search(query, limit, click_store.search_counts(search_term))
+
+        results = []
+        for score, record in matches:
+            lora_info = add_click_count_to_lora_info(dict(record), search_term)
+            lora_info['score'] = round(score, 4)
+            results.append(lora_info)
+
+        with metrics.stage('serialize'):
+            return jsonify({
+                'results': results,
+                'total': total,
+                'search_term': search_term
+            })
+
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error searching loras: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# 标签表中的文件路径 -> 库中的 LoRA 记录，按库版本缓存
+_records_by_path = (None, {})
+
+def library_records_by_path(library):
+    global _records_by_path
+    generation, records = _records_by_path
+    if generation != library.generation:
+        generation = library.generation
+        records = {normalize_index_path(os.path.join(library.base_path, record['relative_path'], record['name'])): record
+                   for record in library.all_records()}
+        _records_by_path = (generation, records)
+    return records
+
+@app.route('/tags', methods=['GET'])
+def list_tags():
+    """按前缀列出训练标签及其出现的 LoRA 数量，path 参数限定子目录"""
+    try:
+        config = load_config()
+        base_path = config.get('lora_path', '')
+
+        if not base_path or not os.path.exists(base_path):
+            return jsonify({'error': 'Invalid base path'}), 404
+
+        ensure_library(base_path)
+        prefix = request.args.get('prefix', '').strip().lower()
+        limit = parse_limit(request.args, DEFAULT_SEARCH_LIMIT)
+        root = os.path.join(base_path, normalize_relative(request.args.get('path', '')))
+        if not os.path.realpath(root).startswith(get_base_realpath()):
+            return jsonify({'error': 'Invalid path'}), 403
+
+        rows = metadata_index.search_tags(prefix, root, limit)
         return jsonify({
-            'lora_files': all_lora_files
+            'tags': [{'tag': tag, 'lora_count': loras, 'total_count': total} for tag, loras, total in rows]
         })
 
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Error scanning all lora files: {e}")
+        logger.error(f"Error listing tags: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/tag-loras', methods=['GET'])
+def get_tag_loras():
+    """返回训练数据中包含某个标签的 LoRA，按该标签出现次数降序"""
+    try:
+        config = load_config()
+        base_path = config.get('lora_path', '')
+
+        if not base_path or not os.path.exists(base_path):
+            return jsonify({'error': 'Invalid base path'}), 404
+
+        tag = normalize_tag(request.args.get('tag', ''))
+        if not tag:
+            return jsonify({'error': 'Missing tag'}), 400
+        limit = request.args.get('limit', type=int)
+
+        library = ensure_library(base_path)
+        records = library_records_by_path(library)
+
+        lora_files = []
+        for path, count in metadata_index.tag_postings(tag):
+            record = records.get(path)
+            if record is None:
+                continue
+            lora_info = add_click_count_to_lora_info(dict(record))
+            lora_info['tag_count'] = count
+            lora_files.append(lora_info)
+            if limit and len(lora_files) >= limit:
+                break
+
+        return jsonify({'tag': tag, 'lora_files': lora_files})
+
+    except Exception as e:
+        logger.error(f"Error getting loras for tag: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def format_hashes(hashes):
+    return {
+        'sha256': hashes['sha256'],
+        'autov2': hashes['sha256'][:10],
+        'addnet': hashes['addnet'],
+        'addnet_short': hashes['addnet'][:12]
+    }
+
+def find_records_by_hash(prefix, records):
+    """按哈希前缀查找库中的 LoRA 记录，返回 [(记录, 哈希类型)]，跳过哈希已失效的文件"""
+    matches = []
+    seen = set()
+    for path, size, mtime_ns, hash_type in metadata_index.find_by_hash(prefix):
+        record = records.get(path)
+        if record is None or path in seen:
+            continue
+        # 文件在计算哈希后被修改过，结果已失效
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if stat.st_size != size or stat.st_mtime_ns != mtime_ns:
+            continue
+        seen.add(path)
+        matches.append((record, hash_type))
+    return matches
+
+@app.route('/lora-by-hash', methods=['GET'])
+def get_lora_by_hash():
+    """按哈希查找 LoRA，支持完整 SHA-256、AutoV2 和 WebUI 图片中的 Lora hashes 短哈希
+
+    hash 参数可以重复或用逗号分隔，返回 {哈希: [匹配的 LoRA]}；
+    pending 为仍在后台计算哈希的文件数，不为 0 时未命中的结果可能稍后出现。
+    """
+    try:
+        config = load_config()
+        base_path = config.get('lora_path', '')
+
+        if not base_path or not os.path.exists(base_path):
+            return jsonify({'error': 'Invalid base path'}), 404
+
+        requested = []
+        for value in request.args.getlist('hash'):
+            requested.extend(v for v in value.split(',') if v.strip())
+        if not requested:
+            return jsonify({'error': 'Missing hash'}), 400
+
+        library = ensure_library(base_path)
+        records = library_records_by_path(library)
+
+        results = {}
+        for value in requested:
+            prefix = normalize_hash(value)
+            if not prefix:
+                return jsonify({'error': f'Invalid hash (at least {MIN_HASH_PREFIX} hex characters): {value}'}), 400
+            matches = []
+            for record, hash_type in find_records_by_hash(prefix, records):
+                lora_info = add_click_count_to_lora_info(dict(record))
+                lora_info['hash_type'] = hash_type
+                matches.append(lora_info)
+            results[value] = matches
+
+        return jsonify({'results': results, 'pending': hash_service.pending})
+
+    except Exception as e:
+        logger.error(f"Error looking up lora by hash: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/lora-hashes', methods=['GET'])
+def get_lora_hashes():
+    """返回单个 LoRA 的哈希，尚未计算时立即计算"""
+    try:
+        config = load_config()
+        base_path = config.get('lora_path', '')
+        sub_path = request.args.get('path', '')
+        file_name = request.args.get('name', '')
+
+        if not all([base_path, file_name]):
+            return jsonify({'error': 'Invalid parameters'}), 400
+
+        file_path = os.path.join(base_path, sub_path, file_name)
+        if not os.path.realpath(file_path).startswith(get_base_realpath()):
+            return jsonify({'error': 'Invalid path'}), 403
+        if not os.path.isfile(file_path):
+            return jsonify({'error': 'File not found'}), 404
+
+        hashes = hash_service.hash_file(file_path)
+        if hashes is None:
+            return jsonify({'error': 'Failed to hash file'}), 500
+        return jsonify({'name': file_name, **format_hashes(hashes)})
+
+    except Exception as e:
+        logger.error(f"Error getting lora hashes: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/hash-status', methods=['GET'])
+def get_hash_status():
+    return jsonify(hash_service.status())
+
+@app.route('/duplicates', methods=['GET'])
+def get_duplicates():
+    """查找内容相同的 LoRA 文件，返回重复组和可回收的磁盘空间
+
+    path 参数限定子目录；verify=0 时只比较文件大小和文件头（不计算完整哈希），
+    结果为疑似重复。完整哈希在请求中不限速计算（与后台队列中正在计算的同一文件
+    共享结果），并写入元数据索引，之后的查询不再读取整个文件。
+    """
+    try:
+        config = load_config()
+        base_path = config.get('lora_path', '')
+
+        if not base_path or not os.path.exists(base_path):
+            return jsonify({'error': 'Invalid base path'}), 404
+
+        root = os.path.join(base_path, normalize_relative(request.args.get('path', '')))
+        if not os.path.realpath(root).startswith(get_base_realpath()):
+            return jsonify({'error': 'Invalid path'}), 403
+        verify = request.args.get('verify', '1') not in ('0', 'false')
+
+        library = ensure_library(base_path)
+        records = library_records_by_path(library)
+        root_key = os.path.join(normalize_index_path(root), '')
+        paths = [path for path in records if path.startswith(root_key)]
+
+        with metrics.stage('duplicates'):
+            groups, stats = find_duplicates(paths, lambda path: hash_service.hash_file(path, throttle=False),
+                                            verify=verify)
+
+        for group in groups:
+            group['files'] = [{
+                'name': records[path]['name'],
+                'relative_path': records[path]['relative_path'],
+                'preview_path': records[path]['preview_path'],
+            } for path in group['files']]
+
+        return jsonify({
+            'verified': verify,
+            'duplicate_sets': len(groups),
+            'duplicate_files': sum(len(group['files']) - 1 for group in groups),
+            'reclaimable_bytes': sum(group['reclaimable_bytes'] for group in groups),
+            'groups': groups,
+            'stats': stats
+        })
+
+    except Exception as e:
+        logger.error(f"Error finding duplicate loras: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/lora-tags', methods=['GET'])
+def get_lora_tags():
+    """返回单个 LoRA 训练数据中出现次数最多的标签"""
+    try:
+        config = load_config()
+        base_path = config.get('lora_path', '')
+        sub_path = request.args.get('path', '')
+        file_name = request.args.get('name', '')
+
+        if not all([base_path, file_name]):
+            return jsonify({'error': 'Invalid parameters'}), 400
+
+        file_path = os.path.join(base_path, sub_path, file_name)
+        if not os.path.realpath(file_path).startswith(get_base_realpath()):
+            return jsonify({'error': 'Invalid path'}), 403
+        if not os.path.exists(file_path):
+            return jsonify({'error': 'File not found'}), 404
+
+        # 索引中还没有这个文件时先解析一次
+        ensure_library(base_path)
+        stat = os.stat(file_path)
+        if metadata_index.get(file_path, stat.st_size, stat.st_mtime_ns) is None:
+            refresh_library_path(os.path.dirname(file_path))
+
+        limit = request.args.get('limit', type=int)
+        rows = metadata_index.get_tags(file_path, limit)
+        return jsonify({
+            'name': file_name,
+            'tags': [{'tag': tag, 'count': count} for tag, count in rows]
+        })
+
+    except Exception as e:
+        logger.error(f"Error getting lora tags: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# 小写文件名（不含扩展名）-> 库中的 LoRA 记录列表，按库版本缓存
+_records_by_stem = (None, {})
+
+def library_records_by_stem(library):
+    global _records_by_stem
+    generation, records = _records_by_stem
+    if generation != library.generation:
+        generation = library.generation
+        records = {}
+        for record in library.all_records():
+            stem = os.path.splitext(record['name'])[0].lower()
+            records.setdefault(stem, []).append(record)
+        _records_by_stem = (generation, records)
+    return records
+
+def resolve_lora_item(item, library):
+    """按相对路径、哈希或名称查找库中的 LoRA，返回 (匹配方式, [记录])
+
+    path 为精确匹配；有 hash 时先按哈希前缀查找，没有结果再按 name（文件名，不区分大小写）查找。
+    """
+    path = item.get('path')
+    if path:
+        path = normalize_relative(path.replace('\\', '/'))
+        if not path.lower().endswith('.safetensors'):
+            path += '.safetensors'
+        record = library_records_by_path(library).get(normalize_index_path(os.path.join(library.base_path, path)))
+        return ('path', [record]) if record else (None, [])
+
+    prefix = normalize_hash(item.get('hash'))
+    if prefix:
+        matches = [record for record, _ in find_records_by_hash(prefix, library_records_by_path(library))]
+        if matches:
+            return 'hash', matches
+
+    name = re.split(r'[\\/]', item.get('name') or '')[-1].lower()
+    if name.endswith('.safetensors'):
+        name = name[:-len('.safetensors')]
+    matches = library_records_by_stem(library).get(name, []) if name else []
+    return ('name', matches) if matches else (None, [])
+
+def match_image_loras(loras, library):
+    """为图片中引用的 LoRA 查找库中的文件：先按哈希，找不到时按文件名"""
+    for lora in loras:
+        lora['matched_by'], matches = resolve_lora_item({'hash': lora.get('hash'), 'name': lora['name']}, library)
+        lora['matches'] = [add_click_count_to_lora_info(dict(record)) for record in matches]
+    return loras
+
+# /lora-batch 一次最多查找的条目数
+MAX_BATCH_ITEMS = 500
+
+def parse_batch_item(item):
+    """把 /lora-batch 的一个条目转换为 {path / hash / name}，字符串视为名称"""
+    if isinstance(item, str):
+        item = {'name': item}
+    if not isinstance(item, dict):
+        raise QueryError(f'Invalid item: {item!r}')
+    query = {key: item[key] for key in ('path', 'hash', 'name') if item.get(key)}
+    if not query or not all(isinstance(value, str) for value in query.values()):
+        raise QueryError(f'Invalid item: {item!r}')
+    if 'hash' in query and not normalize_hash(query['hash']):
+        raise QueryError(f"Invalid hash (at least {MIN_HASH_PREFIX} hex characters): {query['hash']}")
+    return query
+
+@app.route('/lora-batch', methods=['POST'])
+def get_lora_batch():
+    """一次请求查找多个 LoRA，返回与 /lora-files 相同格式的记录
+
+    请求体为 {"items": [...], "previews": true}，每个条目为 {"path": 相对路径}、{"hash": 哈希}
+    或 {"name": 名称}，hash 与 name 可以同时提供，字符串条目视为名称。
+    results 与 items 一一对应，每项为 {query, matched_by, loras}；previews 不为 false 时
+    每个 LoRA 附带全部预览图的 URL。not_found 为没有找到的条目下标，
+    pending 为仍在后台计算哈希的文件数。
+    """
+    try:
+        config = load_config()
+        base_path = config.get('lora_path', '')
+
+        if not base_path or not os.path.exists(base_path):
+            return jsonify({'error': 'Invalid base path'}), 404
+
+        data = request.get_json(silent=True) or {}
+        items = data.get('items')
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'Missing items'}), 400
+        if len(items) > MAX_BATCH_ITEMS:
+            return jsonify({'error': f'Too many items (at most {MAX_BATCH_ITEMS})'}), 400
+        queries = [parse_batch_item(item) for item in items]
+        include_previews = data.get('previews', True) is not False
+
+        library = ensure_library(base_path)
+        # 同一目录只读取一次文件列表
+        listings = {}
+
+        def previews_of(record):
+            relative_path = record['relative_path']
+            if relative_path not in listings:
+                try:
+                    listings[relative_path] = os.listdir(os.path.join(base_path, relative_path))
+                except OSError:
+                    listings[relative_path] = []
+            return list_preview_urls(os.path.join(base_path, relative_path), relative_path,
+                                     os.path.splitext(record['name'])[0], listings[relative_path])
+
+        results = []
+        not_found = []
+        for index, query in enumerate(queries):
+            matched_by, records = resolve_lora_item(query, library)
+            loras = []
+            for record in records:
+                lora_info = lora_event_info(record)
+                if include_previews:
+                    lora_info['previews'] = previews_of(record)
+                loras.append(lora_info)
+            if not loras:
+                not_found.append(index)
+            results.append({'query': query, 'matched_by': matched_by, 'loras': loras})
+
+        return jsonify({'results': results, 'not_found': not_found, 'pending': hash_service.pending})
+
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error looking up lora batch: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/image-metadata', methods=['GET'])
+def get_image_metadata():
+    """解析预览图中的生成参数（WebUI parameters / ComfyUI prompt），只读取 PNG 文本块
+
+    参数与 /preview 相同（path、file），或用 combo_id、file 指定组合预览图；
+    返回提示词、采样参数和引用的 LoRA，LoRA 附带库中匹配到的文件。
+    """
+    try:
+        config = load_config()
+        base_path = config.get('lora_path', '')
+        file_name = request.args.get('file', '')
+        combo_id = request.args.get('combo_id', '')
+
+        if not file_name or not (base_path or combo_id):
+            return jsonify({'error': 'Invalid parameters'}), 400
+
+        if combo_id:
+            ensure_combine_path()
+            root = os.path.realpath(LORA_COMBINE_PATH)
+            file_path = os.path.join(root, combo_id, file_name)
+        else:
+            root = get_base_realpath()
+            file_path = os.path.join(base_path, request.args.get('path', ''), file_name)
+        if not os.path.realpath(file_path).startswith(root):
+            return jsonify({'error': 'Invalid path'}), 403
+        if not os.path.isfile(file_path):
+            return jsonify({'error': 'File not found'}), 404
+
+        with metrics.stage('image_metadata'):
+            try:
+                result = image_metadata_cache.get(file_path)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 415
+
+        # 缓存中的结果是共享的，匹配结果写在副本上
+        result = dict(result)
+        result['loras'] = [dict(lora) for lora in result['loras']]
+        if result['loras'] and base_path and os.path.exists(base_path):
+            match_image_loras(result['loras'], ensure_library(base_path))
+        return jsonify(result)
+
+    except Exception as e:
+        logger.error(f"Error reading image metadata: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/lora-click', methods=['POST'])  # 修正这里，使用列表而不是字典索引
@@ -766,24 +1560,19 @@ def record_lora_click():
         if not lora_name:
             return jsonify({'error': 'Missing lora_name'}), 400
 
-        clicks = load_clicks()
-        
-        # 更新全局点击量
-        clicks["global"][lora_name] = clicks["global"].get(lora_name, 0) + 1
-        
-        # 如果有搜索词，更新搜索相关点击量
-        if search_term:
-            if search_term not in clicks["search"]:
-                clicks["search"][search_term] = {}
-            clicks["search"][search_term][lora_name] = \
-                clicks["search"][search_term].get(lora_name, 0) + 1
-        
-        save_clicks(clicks)
+        # 在内存中更新点击量，由后台线程合并写回磁盘
+        global_clicks, search_clicks = click_store.record(lora_name, search_term)
+        event_bus.publish('clicks_changed', {
+            'name': lora_name,
+            'global_clicks': global_clicks,
+            'search_term': search_term,
+            'search_clicks': search_clicks
+        })
 
         return jsonify({
             'status': 'success',
-            'global_clicks': clicks["global"][lora_name],
-            'search_clicks': clicks["search"].get(search_term, {}).get(lora_name, 0) if search_term else 0
+            'global_clicks': global_clicks,
+            'search_clicks': search_clicks
         })
     except Exception as e:
         logger.error(f"Error recording click: {e}")
@@ -791,22 +1580,13 @@ def record_lora_click():
 
 def add_click_count_to_lora_info(lora_info, search_term=None):
     try:
-        clicks = load_clicks()
         normalized_term = normalize_search_term(search_term) if search_term else None
-        
-        # 添加全局点击数
-        lora_info['global_clicks'] = clicks["global"].get(lora_info['name'], 0)
-        
-        # 添加搜索相关点击数
-        if normalized_term:
-            print(f"Adding search clicks for {lora_info['name']} with term {normalized_term}")
-            print(f"Search clicks data: {clicks['search'].get(normalized_term, {})}")
-            lora_info['search_clicks'] = clicks["search"].get(normalized_term, {}).get(lora_info['name'], 0)
-        else:
-            lora_info['search_clicks'] = 0
-            
-        print(f"Clicks for {lora_info['name']}: global={lora_info['global_clicks']}, search={lora_info['search_clicks']}")
+
+        # 添加全局点击数和搜索相关点击数
+        lora_info['global_clicks'], lora_info['search_clicks'] = \
+            click_store.get_counts(lora_info['name'], normalized_term)
         return lora_info
+
     except Exception as e:
         logger.error(f"Error adding click count: {e}")
         lora_info['global_clicks'] = 0
@@ -828,7 +1608,8 @@ def get_combinations():
                     # 添加预览图信息
                     previews = [f for f in os.listdir(dir_path) if f.endswith('.png')]
                     if previews:
-                        combo['preview_path'] = f'/combination-preview/{dirname}/{previews[0]}'
+                        combo['preview_path'] = versioned_url(f'/combination-preview/{dirname}/{previews[0]}',
+                                                              os.path.join(dir_path, previews[0]))
                     combinations.append(combo)
     return jsonify(combinations)
 
@@ -847,6 +1628,7 @@ def create_combination():
     data['created_at'] = int(time.time())
     with open(os.path.join(combo_dir, 'config.json'), 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
+    event_bus.publish('combination_created', {'combination': data})
     
     return jsonify(data)
 
@@ -854,7 +1636,7 @@ def create_combination():
 def get_combination_preview(combo_id, filename):
     try:
         preview_path = os.path.join(LORA_COMBINE_PATH, combo_id, filename)
-        return send_file(preview_path, mimetype='image/png')
+        return send_cached_image(preview_path, 'image/png')
     except Exception as e:
         logger.error(f"Error sending combination preview: {e}")
         return jsonify({'error': str(e)}), 500
@@ -882,10 +1664,12 @@ def upload_combination_preview(combo_id):
         
         file_path = os.path.join(combo_dir, filename)
         file.save(file_path)
+        preview_path = versioned_url(f'/combination-preview/{combo_id}/{filename}', file_path)
+        event_bus.publish('combination_preview_added', {'id': combo_id, 'preview_path': preview_path})
         
         return jsonify({
             'status': 'success',
-            'preview_path': f'/combination-preview/{combo_id}/{filename}'
+            'preview_path': preview_path
         })
     except Exception as e:
         logger.error(f"Error uploading combination preview: {e}")
@@ -898,7 +1682,7 @@ def get_combination_previews(combo_id):
         if not os.path.exists(combo_dir):
             return jsonify({'error': 'Combination not found'}), 404
             
-        previews = sorted([f'/combination-preview/{combo_id}/{f}' 
+        previews = sorted([versioned_url(f'/combination-preview/{combo_id}/{f}', os.path.join(combo_dir, f))
                         for f in os.listdir(combo_dir) 
                         if f.endswith('.png')],
                         key=lambda x: 'preview.png' in x)
@@ -923,6 +1707,7 @@ def delete_combination_preview(combo_id, filename):
             
         # 删除文件
         os.remove(preview_path)
+        event_bus.publish('combination_preview_deleted', {'id': combo_id, 'filename': filename})
         
         return jsonify({'status': 'success'})
     except Exception as e:
@@ -939,6 +1724,7 @@ def delete_combination(combo_id):
         # 删除目录及其所有内容
         import shutil
         shutil.rmtree(combo_dir)
+        event_bus.publish('combination_deleted', {'id': combo_id})
         
         return jsonify({'status': 'success'})
     except Exception as e:
@@ -967,7 +1753,7 @@ def move_lora():
         # 验证路径
         for path in [source_path, target_path]:
             real_path = os.path.realpath(path)
-            if not real_path.startswith(os.path.realpath(base_path)):
+            if not real_path.startswith(get_base_realpath()):
                 logger.error(f"Invalid path: {path}")
                 return jsonify({'error': 'Invalid path'}), 403
         
@@ -1020,7 +1806,10 @@ def move_lora():
                     except Exception as rollback_error:
                         logger.error(f"Error during rollback: {str(rollback_error)}")
                 return jsonify({'error': f'Error moving file {file}: {str(e)}'}), 500
-            
+
+        refresh_library_path(source_path)
+        refresh_library_path(target_path)
+
         return jsonify({
             'status': 'success',
             'moved_files': moved_files
@@ -1030,10 +1819,111 @@ def move_lora():
         logger.error(f"Error moving lora files: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/events', methods=['GET'])
+def stream_events():
+    """Server-Sent Events：推送 LoRA、预览图、点击量和组合的增量变化
+
+    事件类型：lora_added / lora_updated / lora_removed（data.loras 为变化的 LoRA 列表）、
+    preview_added、preview_swapped、clicks_changed、combination_created、
+    combination_deleted、combination_preview_added、combination_preview_deleted、
+    config_changed；library_reloaded 和 resync 表示客户端需要重新加载完整列表。
+    断线重连时浏览器发送的 Last-Event-ID 用于补发错过的事件。
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    subscription = event_bus.subscribe(last_event_id)
+    return Response(event_bus.stream(subscription), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus 文本格式的累计指标"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/profiler', methods=['GET'])
+def get_profiler():
+    """采样分析器状态；format=collapsed 时返回 collapsed stack 文本，可用于生成火焰图"""
+    if request.args.get('format') == 'collapsed':
+        return Response(profiler.collapsed(request.args.get('limit', type=int)), mimetype='text/plain')
+    return jsonify(profiler.status())
+
+@app.route('/profiler', methods=['POST'])
+def toggle_profiler():
+    try:
+        data = request.json or {}
+        if data.get('reset'):
+            profiler.reset()
+        if 'enabled' in data:
+            if data['enabled']:
+                interval = data.get('interval')
+                if interval in (None, ''):
+                    interval = None
+                else:
+                    # 非正数的间隔会让采样线程不等待、持续占满一个 CPU 核
+                    try:
+                        interval = None if isinstance(interval, bool) else float(interval)
+                    except (TypeError, ValueError):
+                        interval = None
+                    if interval is None or not 0 < interval < float('inf'):
+                        return jsonify({'error': 'interval must be a positive number of seconds'}), 400
+                profiler.start(interval)
+                logger.info(f"Sampling profiler started (interval {profiler.interval}s)")
+            else:
+                profiler.stop()
+                logger.info("Sampling profiler stopped")
+        return jsonify(profiler.status())
+    except Exception as e:
+        logger.error(f"Error toggling profiler: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# 服务器默认配置（可通过 config.json 中的 server_host / server_port / server_threads 或命令行参数修改）
+DEFAULT_SERVER_HOST = '127.0.0.1'
+DEFAULT_SERVER_PORT = 5000
+# 每个打开的 /events 连接会占用一个线程
+DEFAULT_SERVER_THREADS = 16
+
+def parse_server_args(argv=None):
+    import argparse
+    config = load_config()
+    parser = argparse.ArgumentParser(description='LoraReader backend server')
+    parser.add_argument('--dev', action='store_true',
+                        help='使用 Flask 开发服务器（debug 模式，修改代码后自动重启）')
+    parser.add_argument('--host', default=config.get('server_host', DEFAULT_SERVER_HOST))
+    parser.add_argument('--port', type=int, default=config.get('server_port', DEFAULT_SERVER_PORT))
+    parser.add_argument('--threads', type=int, default=config.get('server_threads', DEFAULT_SERVER_THREADS),
+                        help='同时处理请求的线程数')
+    return parser.parse_args(argv)
+
+def run_server(args):
+    """启动 HTTP 服务器
+
+    LoRA 库、搜索索引和点击量都保存在进程内存中，因此只使用单进程多线程：
+    完整扫描在一个线程中进行时，其他线程继续用已加载的数据响应浏览和预览图请求。
+    安装了 waitress 时使用 waitress，否则退回到关闭 debug 的多线程 Werkzeug 服务器。
+    """
+    if args.dev:
+        logger.info(f"Starting Flask development server on {args.host}:{args.port}...")
+        app.run(host=args.host, port=args.port, debug=True)
+        return
+
+    try:
+        from waitress import serve
+    except ImportError:
+        logger.warning("waitress is not installed, falling back to the threaded Werkzeug server")
+        logger.info(f"Starting server on {args.host}:{args.port}...")
+        app.run(host=args.host, port=args.port, debug=False, threaded=True, use_reloader=False)
+        return
+
+    logger.info(f"Starting waitress on {args.host}:{args.port} with {args.threads} threads...")
+    serve(app, host=args.host, port=args.port, threads=max(1, args.threads))
+
 if __name__ == '__main__':
     try:
-        logger.info("Starting Flask server...")        
-        app.run(debug=True, port=5000)    
+        run_server(parse_server_args())
     except Exception as e:        
         logger.error(f"Server error: {e}")
         input("Press Enter to exit...")
@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 解析逻辑（字段、基础模型评分规则）变化时递增，旧记录会被整体丢弃重新解析
+INDEX_VERSION = 2
+
+# 累积多少条写入后提交一次事务，避免每个文件都触发一次磁盘同步
+COMMIT_BATCH_SIZE = 200
+
+
+def normalize_index_path(path):
+    """统一索引中使用的文件路径格式"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+class MetadataIndex:
+    """以 (路径, 文件大小, 修改时间) 为键的 safetensors 元数据持久化索引
+
+    revision 用于附加解析规则的版本（例如底模规则文件的指纹），变化时同样重建索引。
+    """
+
+    def __init__(self, db_path, revision=''):
+        self.db_path = db_path
+        self.version = f'{INDEX_VERSION}:{revision}' if revision else str(INDEX_VERSION)
+        self._lock = threading.RLock()
+        self._pending = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._lock:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS index_info (key TEXT PRIMARY KEY, value TEXT)')
+            row = self._conn.execute(
+                "SELECT value FROM index_info WHERE key = 'version'").fetchone()
+            if row is None or row[0] != self.version:
+                # 版本不一致时丢弃全部旧数据
+                if row is not None:
+                    logger.info(f"Metadata index version changed ({row[0]} -> {self.version}), rebuilding")
+                self._conn.execute('DROP TABLE IF EXISTS lora_metadata')
+                self._conn.execute('DROP TABLE IF EXISTS lora_tags')
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO index_info (key, value) VALUES ('version', ?)",
+                    (self.version,))
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS lora_metadata (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    metadata TEXT NOT NULL
+                )
+            ''')
+            # 训练标签的倒排表：标签 -> LoRA，按次数排序的查询走 (tag, count) 索引
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS lora_tags (
+                    path TEXT NOT NULL,
+                    tag TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (path, tag)
+                ) WITHOUT ROWID
+            ''')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS lora_tags_by_tag ON lora_tags (tag, count DESC)')
+            # 文件哈希与解析逻辑无关，索引版本变化时保留
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS lora_hashes (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    addnet TEXT NOT NULL
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS lora_hashes_by_sha256 ON lora_hashes (sha256)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS lora_hashes_by_addnet ON lora_hashes (addnet)')
+            self._conn.commit()
+
+    def get(self, path, size, mtime_ns):
+        """读取缓存的元数据，文件大小或修改时间不一致时返回 None"""
+        key = normalize_index_path(path)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime_ns, metadata FROM lora_metadata WHERE path = ?',
+                (key,)).fetchone()
+        if row is None or row[0] != size or row[1] != mtime_ns:
+            return None
+        try:
+            return json.loads(row[2])
+        except ValueError:
+            return None
+
+    def put(self, path, size, mtime_ns, metadata, tags=None):
+        """写入解析结果，tags 为 {标签: 次数} 时同时替换该文件的标签，写入按批次提交"""
+        key = normalize_index_path(path)
+        data = json.dumps(metadata, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO lora_metadata (path, size, mtime_ns, metadata) VALUES (?, ?, ?, ?)',
+                (key, size, mtime_ns, data))
+            if tags is not None:
+                self._conn.execute('DELETE FROM lora_tags WHERE path = ?', (key,))
+                self._conn.executemany(
+                    'INSERT INTO lora_tags (path, tag, count) VALUES (?, ?, ?)',
+                    [(key, tag, count) for tag, count in tags.items()])
+            self._pending += 1
+            if self._pending >= COMMIT_BATCH_SIZE:
+                self._commit()
+
+    def remove(self, path):
+        key = normalize_index_path(path)
+        with self._lock:
+            self._conn.execute('DELETE FROM lora_metadata WHERE path = ?', (key,))
+            self._conn.execute('DELETE FROM lora_tags WHERE path = ?', (key,))
+            self._conn.execute('DELETE FROM lora_hashes WHERE path = ?', (key,))
+            self._pending += 1
+
+    def prune(self, root, seen_paths):
+        """删除 root 目录下已经不存在的文件记录"""
+        prefix = normalize_index_path(root).rstrip(os.sep) + os.sep
+        seen = {normalize_index_path(p) for p in seen_paths}
+        with self._lock:
+            stale = [row[0] for row in self._conn.execute(
+                         'SELECT path FROM lora_metadata UNION SELECT path FROM lora_hashes')
+                     if row[0].startswith(prefix) and row[0] not in seen]
+            if stale:
+                self._conn.executemany('DELETE FROM lora_metadata WHERE path = ?',
+                                       [(p,) for p in stale])
+                self._conn.executemany('DELETE FROM lora_tags WHERE path = ?',
+                                       [(p,) for p in stale])
+                self._conn.executemany('DELETE FROM lora_hashes WHERE path = ?',
+                                       [(p,) for p in stale])
+                self._pending += len(stale)
+                logger.info(f"Pruned {len(stale)} stale entries from metadata index")
+            self._commit()
+
+    def get_tags(self, path, limit=None):
+        """返回某个文件的 [(标签, 次数)]，按次数降序"""
+        key = normalize_index_path(path)
+        with self._lock:
+            return self._conn.execute(
+                'SELECT tag, count FROM lora_tags WHERE path = ? ORDER BY count DESC, tag LIMIT ?',
+                (key, -1 if limit is None else limit)).fetchall()
+
+    def tag_postings(self, tag, limit=None):
+        """返回带有某个标签的 [(文件路径, 次数)]，按次数降序"""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT path, count FROM lora_tags WHERE tag = ? ORDER BY count DESC, path LIMIT ?',
+                (tag, -1 if limit is None else limit)).fetchall()
+
+    def search_tags(self, prefix='', root=None, limit=50):
+        """按前缀列出标签，返回 [(标签, LoRA 数, 总次数)]，按 LoRA 数降序
+
+        root 不为空时只统计该目录下的文件。
+        """
+        conditions, params = [], []
+        if prefix:
+            # 前缀查询可以使用 (tag, count) 索引的范围扫描
+            conditions.append('tag >= ? AND tag < ?')
+            params += [prefix, prefix + '\U0010ffff']
+        if root:
+            root_prefix = normalize_index_path(root).rstrip(os.sep) + os.sep
+            conditions.append('path >= ? AND path < ?')
+            params += [root_prefix, root_prefix + '\U0010ffff']
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        with self._lock:
+            return self._conn.execute(
+                f'SELECT tag, COUNT(*) AS loras, SUM(count) FROM lora_tags {where} '
+                'GROUP BY tag ORDER BY loras DESC, tag LIMIT ?',
+                params + [limit]).fetchall()
+
+    def get_hashes(self, path, size, mtime_ns):
+        """读取缓存的文件哈希，文件大小或修改时间不一致时返回 None"""
+        key = normalize_index_path(path)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime_ns, sha256, addnet FROM lora_hashes WHERE path = ?',
+                (key,)).fetchone()
+        if row is None or row[0] != size or row[1] != mtime_ns:
+            return None
+        return {'sha256': row[2], 'addnet': row[3]}
+
+    def put_hashes(self, path, size, mtime_ns, hashes):
+        """写入文件哈希并立即提交（每个哈希的计算成本都很高）"""
+        key = normalize_index_path(path)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO lora_hashes (path, size, mtime_ns, sha256, addnet) VALUES (?, ?, ?, ?, ?)',
+                (key, size, mtime_ns, hashes['sha256'], hashes['addnet']))
+            self._pending += 1
+            self._commit()
+
+    def find_by_hash(self, prefix):
+        """按哈希前缀查找文件，同时匹配完整 SHA-256（AutoV2）和 addnet 哈希
+
+        返回 [(文件路径, 文件大小, 修改时间, 命中的哈希类型)]。
+        """
+        upper = prefix + 'g'  # 十六进制字符都小于 'g'，用于前缀范围查询
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, size, mtime_ns, 'sha256' FROM lora_hashes WHERE sha256 >= ? AND sha256 < ? "
+                "UNION ALL "
+                "SELECT path, size, mtime_ns, 'addnet' FROM lora_hashes WHERE addnet >= ? AND addnet < ?",
+                (prefix, upper, prefix, upper)).fetchall()
+        return rows
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def _commit(self):
+        if self._pending:
+            self._conn.commit()
+            self._pending = 0
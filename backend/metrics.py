@@ -0,0 +1,229 @@
+import functools
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# 请求耗时直方图的分桶上界（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DEFAULT_PROFILE_INTERVAL = 0.01
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels.items()) + '}'
+
+
+class Metrics:
+    """进程内的累计计时与计数，/metrics 以 Prometheus 文本格式输出
+
+    stage() 记录扫描流程各阶段（目录列举、文件头读取、底模识别、配置读取、
+    点击量合并、序列化）的调用次数与耗时；在 begin_request() 之后同一线程
+    内的阶段耗时还会汇总到当前请求，用于生成 Server-Timing 响应头。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stages = {}
+        self._requests = {}
+        self._histograms = {}
+        self._counters = Counter()
+        self.started = time.time()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """装饰器形式的 stage()"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe_stage(self, name, seconds):
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+        current = getattr(self._local, 'request_stages', None)
+        if current is not None:
+            current[name] = current.get(name, 0.0) + seconds
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def begin_request(self):
+        self._local.request_stages = {}
+
+    def end_request(self):
+        """结束当前请求的阶段汇总，返回 {阶段: 秒}"""
+        stages = getattr(self._local, 'request_stages', None) or {}
+        self._local.request_stages = None
+        return stages
+
+    def observe_request(self, endpoint, method, status, seconds):
+        with self._lock:
+            key = (endpoint, method, status)
+            stats = self._requests.get(key)
+            if stats is None:
+                stats = self._requests[key] = [0, 0.0]
+            stats[0] += 1
+            stats[1] += seconds
+
+            buckets = self._histograms.get(endpoint)
+            if buckets is None:
+                buckets = self._histograms[endpoint] = [0] * (len(LATENCY_BUCKETS) + 1)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+                    break
+            else:
+                buckets[-1] += 1
+
+    def render_prometheus(self):
+        """生成 Prometheus 文本格式（0.0.4）的指标"""
+        with self._lock:
+            stages = {name: list(stats) for name, stats in self._stages.items()}
+            requests = {key: list(stats) for key, stats in self._requests.items()}
+            histograms = {name: list(buckets) for name, buckets in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = [
+            '# HELP lorareader_uptime_seconds Seconds since the backend started.',
+            '# TYPE lorareader_uptime_seconds gauge',
+            f'lorareader_uptime_seconds {time.time() - self.started:.3f}',
+            '# HELP lorareader_stage_calls_total Number of times a pipeline stage ran.',
+            '# TYPE lorareader_stage_calls_total counter',
+        ]
+        for name, (count, _, _) in sorted(stages.items()):
+            lines.append(f'lorareader_stage_calls_total{_labels(stage=name)} {count}')
+        lines += ['# HELP lorareader_stage_seconds_total Cumulative time spent in a pipeline stage.',
+                  '# TYPE lorareader_stage_seconds_total counter']
+        for name, (_, total, _) in sorted(stages.items()):
+            lines.append(f'lorareader_stage_seconds_total{_labels(stage=name)} {total:.6f}')
+        lines += ['# HELP lorareader_stage_max_seconds Slowest single run of a pipeline stage.',
+                  '# TYPE lorareader_stage_max_seconds gauge']
+        for name, (_, _, longest) in sorted(stages.items()):
+            lines.append(f'lorareader_stage_max_seconds{_labels(stage=name)} {longest:.6f}')
+
+        lines += ['# HELP lorareader_requests_total HTTP requests handled.',
+                  '# TYPE lorareader_requests_total counter']
+        for (endpoint, method, status), (count, _) in sorted(requests.items()):
+            lines.append(f'lorareader_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+        lines += ['# HELP lorareader_request_duration_seconds HTTP request latency.',
+                  '# TYPE lorareader_request_duration_seconds histogram']
+        request_sums = {}
+        for (endpoint, _, _), (_, total) in requests.items():
+            request_sums[endpoint] = request_sums.get(endpoint, 0.0) + total
+        for endpoint, buckets in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, buckets):
+                cumulative += count
+                lines.append(f'lorareader_request_duration_seconds_bucket{_labels(endpoint=endpoint, le=bound)} {cumulative}')
+            cumulative += buckets[-1]
+            lines.append(f'lorareader_request_duration_seconds_bucket{_labels(endpoint=endpoint, le="+Inf")} {cumulative}')
+            lines.append(f'lorareader_request_duration_seconds_sum{_labels(endpoint=endpoint)} {request_sums.get(endpoint, 0.0):.6f}')
+            lines.append(f'lorareader_request_duration_seconds_count{_labels(endpoint=endpoint)} {cumulative}')
+
+        for name, value in sorted(counters.items()):
+            lines.append(f'# TYPE lorareader_{name}_total counter')
+            lines.append(f'lorareader_{name}_total {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    """按固定间隔采样所有线程调用栈的轻量分析器，默认关闭
+
+    结果为 collapsed stack 格式（"模块:函数;模块:函数 次数"），
+    可以直接交给 flamegraph.pl 或 speedscope 生成火焰图。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = Counter()
+        self._thread = None
+        self._stop = threading.Event()
+        self.interval = DEFAULT_PROFILE_INTERVAL
+        self.sample_count = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None):
+        with self._lock:
+            if interval:
+                self.interval = interval
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=1)
+        self._thread = None
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self.sample_count = 0
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{frame.f_globals.get("__name__", "?")}:{code.co_name}')
+                    frame = frame.f_back
+                stacks.append(';'.join(reversed(stack)))
+            with self._lock:
+                self._samples.update(stacks)
+                self.sample_count += 1
+
+    def collapsed(self, limit=None):
+        """返回 collapsed stack 文本，按采样次数降序"""
+        with self._lock:
+            items = self._samples.most_common(limit)
+        return '\n'.join(f'{stack} {count}' for stack, count in items) + ('\n' if items else '')
+
+    def status(self):
+        with self._lock:
+            return {
+                'running': self.running,
+                'interval': self.interval,
+                'samples': self.sample_count,
+                'stacks': len(self._samples),
+            }
+
+
+# 进程内共享的实例
+metrics = Metrics()
+profiler = SamplingProfiler()
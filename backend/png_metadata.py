@@ -0,0 +1,321 @@
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+TEXT_CHUNKS = (b'tEXt', b'zTXt', b'iTXt')
+
+# 单个文本块的大小上限，超出视为损坏文件
+MAX_TEXT_CHUNK = 64 * 1024 * 1024
+
+# 压缩文本块解压后的大小上限，防止很小的图片解压出巨大的数据
+MAX_TEXT_SIZE = 16 * 1024 * 1024
+
+# 缓存的图片解析结果数量
+DEFAULT_CACHE_SIZE = 256
+
+# LoRA Stacker 节点的最大槽位数
+MAX_STACKER_SLOTS = 49
+
+# A1111 参数行的 "键: 值" 格式，值可以是带引号的字符串
+_PARAM_RE = re.compile(r'\s*([\w][\w \-/]+):\s*("(?:\\.|[^\\"])+"|[^,]*)(?:,|$)')
+_PROMPT_LORA_RE = re.compile(r'<(lora|lyco):([^:>]+)(?::([^:>]*))?[^>]*>', re.IGNORECASE)
+
+
+def _decompress(data):
+    decompressor = zlib.decompressobj()
+    text = decompressor.decompress(data, MAX_TEXT_SIZE)
+    if decompressor.unconsumed_tail:
+        raise ValueError(f'text exceeds {MAX_TEXT_SIZE} bytes after decompression')
+    return text
+
+
+def _decode_text_chunk(kind, data):
+    """解析一个文本块，返回 (关键字, 文本)"""
+    keyword, _, rest = data.partition(b'\x00')
+    keyword = keyword.decode('latin-1')
+    if kind == b'tEXt':
+        return keyword, rest.decode('latin-1')
+    if kind == b'zTXt':
+        # 压缩方式字节之后为 zlib 数据
+        return keyword, _decompress(rest[1:]).decode('latin-1')
+    # iTXt：压缩标志、压缩方式、语言标签\0、翻译后的关键字\0、UTF-8 文本
+    compressed = rest[:1] == b'\x01'
+    _, _, rest = rest[2:].partition(b'\x00')
+    _, _, text = rest.partition(b'\x00')
+    if compressed:
+        text = _decompress(text)
+    return keyword, text.decode('utf-8', errors='replace')
+
+
+def read_png_text_chunks(file_path):
+    """只读取 PNG 的文本块（tEXt / zTXt / iTXt），不读取图像数据
+
+    生成工具通常把参数写在 IDAT 之前，读到 IDAT 即停止；如果 IDAT 之前
+    没有任何文本块，再跳过（seek，不读取）图像数据查找文件末尾的文本块。
+    """
+    chunks = {}
+    with open(file_path, 'rb') as f:
+        if f.read(8) != PNG_SIGNATURE:
+            raise ValueError(f"Not a PNG file: {file_path}")
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            length, kind = struct.unpack('>I4s', header)
+            if kind == b'IEND':
+                break
+            if kind == b'IDAT' and chunks:
+                break
+            if kind in TEXT_CHUNKS and length <= MAX_TEXT_CHUNK:
+                data = f.read(length)
+                f.seek(4, os.SEEK_CUR)  # CRC
+                try:
+                    keyword, text = _decode_text_chunk(kind, data)
+                except (ValueError, zlib.error) as e:
+                    logger.warning(f"Invalid {kind.decode()} chunk in {file_path}: {e}")
+                    continue
+                chunks[keyword] = text
+            else:
+                f.seek(length + 4, os.SEEK_CUR)
+    return chunks
+
+
+def _unquote(value):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value[1:-1]
+    return value
+
+
+def parse_lora_hashes(value):
+    """解析 "名称: 哈希, 名称: 哈希" 格式的 Lora hashes 字段，返回 {名称: 哈希}"""
+    hashes = {}
+    for item in value.split(','):
+        name, sep, hash_value = item.rpartition(':')
+        if sep and name.strip():
+            hashes[name.strip()] = hash_value.strip()
+    return hashes
+
+
+def prompt_lora_weights(prompt):
+    """提取提示词中的 <lora:名称:权重>，返回 {名称: 权重}"""
+    weights = {}
+    for _, name, weight in _PROMPT_LORA_RE.findall(prompt or ''):
+        try:
+            weights[name.strip()] = float(weight) if weight else 1.0
+        except ValueError:
+            weights[name.strip()] = 1.0
+    return weights
+
+
+def parse_a1111_parameters(text):
+    """解析 WebUI 写入的 parameters 文本：正向提示词、反向提示词和参数行"""
+    lines = text.strip().split('\n')
+    params_line = ''
+    if lines and _PARAM_RE.findall(lines[-1]) and lines[-1].lstrip().startswith('Steps:'):
+        params_line = lines.pop()
+
+    positive, negative = [], []
+    target = positive
+    for line in lines:
+        if line.startswith('Negative prompt:'):
+            target = negative
+            line = line[len('Negative prompt:'):].strip()
+        target.append(line)
+
+    parameters = {key.strip(): _unquote(value) for key, value in _PARAM_RE.findall(params_line)}
+    positive_prompt = '\n'.join(positive).strip()
+    negative_prompt = '\n'.join(negative).strip()
+
+    weights = prompt_lora_weights(positive_prompt)
+    loras = []
+    hashes = parse_lora_hashes(parameters.get('Lora hashes', ''))
+    for name, hash_value in hashes.items():
+        clean_name = re.sub(r'^(?:lora|lyco)_', '', name)
+        loras.append({
+            'name': clean_name,
+            'weight': weights.get(clean_name, weights.get(name, 1.0)),
+            'hash': hash_value or None,
+            'source': 'webui'
+        })
+    # 提示词中引用但没有哈希记录的 LoRA
+    for name, weight in weights.items():
+        if name not in hashes and not any(l['name'] == name for l in loras):
+            loras.append({'name': name, 'weight': weight, 'hash': None, 'source': 'webui'})
+
+    return {
+        'format': 'a1111',
+        'positive_prompt': positive_prompt,
+        'negative_prompt': negative_prompt,
+        'parameters': parameters,
+        'loras': loras,
+    }
+
+
+def _load_json(text):
+    try:
+        # Python 的 json 模块可以直接解析 ComfyUI 写出的 NaN / Infinity
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _lora_stem(path):
+    name = re.split(r'[\\/]', str(path))[-1]
+    return name[:-len('.safetensors')] if name.lower().endswith('.safetensors') else name
+
+
+def _float(value, default=1.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _comfyui_loras(prompt):
+    loras = []
+    for node_id, node in prompt.items():
+        if not isinstance(node, dict):
+            continue
+        inputs = node.get('inputs') or {}
+        if not isinstance(inputs, dict):
+            continue
+        class_type = node.get('class_type', '')
+        if class_type == 'LoRA Stacker':
+            # 槽位数最多为 MAX_STACKER_SLOTS，也避免 lora_count 为 Infinity 时出错
+            count = _float(inputs.get('lora_count'), 0)
+            count = int(min(max(count, 0), MAX_STACKER_SLOTS)) if count == count else 0
+            slots = [(inputs.get(f'lora_name_{i}'), inputs.get(f'lora_wt_{i}')) for i in range(1, count + 1)]
+        elif 'lora_name' in inputs:
+            # LoraLoader / LoraLoaderModelOnly 等节点
+            slots = [(inputs.get('lora_name'), inputs.get('strength_model', inputs.get('strength', 1.0)))]
+        else:
+            continue
+        for name, weight in slots:
+            if not isinstance(name, str) or not name or name == 'None':
+                continue
+            loras.append({
+                'name': _lora_stem(name),
+                'weight': _float(weight),
+                'hash': None,
+                'source': 'comfyui',
+                'original_path': name,
+                'node_id': node_id
+            })
+    return loras
+
+
+def _comfyui_text(prompt, link):
+    """沿着节点连接找到 CLIPTextEncode 之类节点的文本"""
+    seen = set()
+    while isinstance(link, list) and link and isinstance(link[0], (str, int)) and str(link[0]) not in seen:
+        node_id = str(link[0])
+        seen.add(node_id)
+        # 手工编辑或损坏的 prompt 中节点可能不是对象
+        node = prompt.get(node_id)
+        inputs = node.get('inputs') if isinstance(node, dict) else None
+        if not isinstance(inputs, dict):
+            return None
+        for key in ('text', 'text_g', 'positive', 'negative', 'conditioning'):
+            value = inputs.get(key)
+            if isinstance(value, str):
+                return value
+            if isinstance(value, list):
+                link = value
+                break
+        else:
+            return None
+    return None
+
+
+def parse_comfyui_prompt(prompt_text, workflow_text=None):
+    """解析 ComfyUI 的 prompt（API 格式）JSON，提取 LoRA、提示词和采样参数"""
+    prompt = _load_json(prompt_text) or {}
+    result = {
+        'format': 'comfyui',
+        'positive_prompt': '',
+        'negative_prompt': '',
+        'parameters': {},
+        'loras': _comfyui_loras(prompt),
+    }
+
+    for node in prompt.values():
+        if not isinstance(node, dict):
+            continue
+        inputs = node.get('inputs') or {}
+        if not isinstance(inputs, dict):
+            continue
+        if 'positive' in inputs and 'negative' in inputs and not result['positive_prompt']:
+            result['positive_prompt'] = _comfyui_text(prompt, inputs['positive']) or ''
+            result['negative_prompt'] = _comfyui_text(prompt, inputs['negative']) or ''
+        if 'steps' in inputs and 'Steps' not in result['parameters']:
+            for source, key in (('seed', 'Seed'), ('noise_seed', 'Seed'), ('steps', 'Steps'), ('cfg', 'CFG scale'),
+                                ('sampler_name', 'Sampler'), ('scheduler', 'Schedule type'),
+                                ('denoise', 'Denoising strength')):
+                if source in inputs and not isinstance(inputs[source], list):
+                    result['parameters'][key] = str(inputs[source])
+        if 'ckpt_name' in inputs and 'Model' not in result['parameters']:
+            result['parameters']['Model'] = _lora_stem(inputs['ckpt_name'])
+        if 'width' in inputs and 'height' in inputs and 'Size' not in result['parameters']:
+            if not isinstance(inputs['width'], list) and not isinstance(inputs['height'], list):
+                result['parameters']['Size'] = f"{inputs['width']}x{inputs['height']}"
+
+    if workflow_text is not None:
+        workflow = _load_json(workflow_text)
+        nodes = workflow.get('nodes') if workflow else None
+        result['workflow_nodes'] = len(nodes) if isinstance(nodes, list) else 0
+    return result
+
+
+def parse_png_metadata(file_path):
+    """读取并解析 PNG 中的生成参数，无法识别时 format 为 None"""
+    chunks = read_png_text_chunks(file_path)
+    if 'prompt' in chunks and _load_json(chunks['prompt']) is not None:
+        result = parse_comfyui_prompt(chunks['prompt'], chunks.get('workflow'))
+        # 部分 ComfyUI 节点同时写入 WebUI 格式的 parameters
+        if 'parameters' in chunks:
+            a1111 = parse_a1111_parameters(chunks['parameters'])
+            result['parameters'] = {**a1111['parameters'], **result['parameters']}
+            result['positive_prompt'] = result['positive_prompt'] or a1111['positive_prompt']
+            result['negative_prompt'] = result['negative_prompt'] or a1111['negative_prompt']
+    elif 'parameters' in chunks:
+        result = parse_a1111_parameters(chunks['parameters'])
+    else:
+        result = {'format': None, 'positive_prompt': '', 'negative_prompt': '', 'parameters': {}, 'loras': []}
+    result['text_chunks'] = sorted(chunks)
+    return result
+
+
+class ImageMetadataCache:
+    """按 (路径, 大小, 修改时间) 缓存图片解析结果的 LRU 缓存"""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, file_path):
+        stat = os.stat(file_path)
+        key = (os.path.normcase(os.path.abspath(file_path)), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        result = parse_png_metadata(file_path)
+        with self._lock:
+            self._entries[key] = result
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
@@ -0,0 +1,34 @@
+import json
+import struct
+
+# safetensors 规范限制文件头不超过 100MB，超出视为损坏文件
+MAX_HEADER_SIZE = 100 * 1024 * 1024
+
+
+def read_safetensors_header(file_path):
+    """只读取 safetensors 的 8 字节长度前缀和 JSON 文件头，不加载任何张量"""
+    with open(file_path, 'rb') as f:
+        prefix = f.read(8)
+        if len(prefix) != 8:
+            raise ValueError(f"File too small to be safetensors: {file_path}")
+
+        (header_size,) = struct.unpack('<Q', prefix)
+        if header_size <= 0 or header_size > MAX_HEADER_SIZE:
+            raise ValueError(f"Invalid safetensors header size {header_size}: {file_path}")
+
+        raw = f.read(header_size)
+        if len(raw) != header_size:
+            raise ValueError(f"Truncated safetensors header: {file_path}")
+
+    header = json.loads(raw.decode('utf-8'))
+    if not isinstance(header, dict):
+        raise ValueError(f"Invalid safetensors header: {file_path}")
+    return header
+
+
+def read_safetensors_metadata(file_path):
+    """返回文件头中的 __metadata__ 字段，没有元数据时返回空字典"""
+    metadata = read_safetensors_header(file_path).get('__metadata__') or {}
+    if not isinstance(metadata, dict):
+        return {}
+    return metadata
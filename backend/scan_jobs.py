@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# 保留多少个已结束任务的状态供查询
+MAX_FINISHED_JOBS = 20
+
+
+class ScanCancelled(Exception):
+    """在目录遍历回调中抛出，用于在两批记录之间尽快中止扫描"""
+
+
+class ScanJob:
+    """一次后台扫描任务的状态，计数由扫描线程更新，读取时不加锁
+
+    records 保存已扫描到的记录，供加入任务的请求从头读取；任务结束且没有
+    读取方时释放（置为 None）。
+    """
+
+    def __init__(self, key, refresh):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.refresh = refresh
+        self.state = 'running'
+        self.error = None
+        self.files_seen = 0
+        self.files_parsed = 0
+        self.dirs_seen = 0
+        self.started_at = time.time()
+        self.finished_at = None
+        self._started = time.perf_counter()
+        self._elapsed = None
+        self._cancel = threading.Event()
+        self.records = []
+        self._changed = threading.Condition()
+        self._followers = 0
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def on_scan(self, relative_path, lora_count):
+        """扫描进度回调：files_seen 是目前已遍历到的文件数，遍历结束前会继续增长"""
+        if self.cancelled:
+            raise ScanCancelled()
+        self.dirs_seen += 1
+        self.files_seen += lora_count
+
+    def wait(self, timeout=None):
+        """等待任务结束，返回任务是否已结束"""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.state != 'running', timeout)
+
+    def follow(self):
+        """从第一条开始逐批产出任务扫描到的记录，任务结束后返回最终状态
+
+        任务在开始读取之前已经结束并释放了记录时直接返回 None，调用方应改为读取已加载的库。
+        """
+        with self._changed:
+            if self.records is None:
+                return None
+            self._followers += 1
+        index = 0
+        try:
+            while True:
+                with self._changed:
+                    self._changed.wait_for(lambda: index < len(self.records) or self.state != 'running')
+                    batch = self.records[index:]
+                    state = self.state
+                index += len(batch)
+                if batch:
+                    yield batch
+                elif state != 'running':
+                    return state
+        finally:
+            with self._changed:
+                self._followers -= 1
+                self._release()
+
+    def _release(self):
+        # 调用方需持有 self._changed
+        if self._followers == 0 and self.state != 'running':
+            self.records = None
+
+    def to_dict(self):
+        elapsed = self._elapsed if self._elapsed is not None else time.perf_counter() - self._started
+        seen = max(self.files_seen, self.files_parsed)
+        return {
+            'id': self.id,
+            'state': self.state,
+            'base_path': self.key,
+            'refresh': self.refresh,
+            'files_seen': seen,
+            'files_parsed': self.files_parsed,
+            'files_remaining': seen - self.files_parsed,
+            'dirs_seen': self.dirs_seen,
+            'elapsed': round(elapsed, 3),
+            'files_per_second': round(self.files_parsed / elapsed, 1) if elapsed > 0 else 0.0,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+        }
+
+
+class ScanJobManager:
+    """在后台线程中运行 LoRA 库扫描任务
+
+    同一个目录同时只运行一个任务：已有任务在运行时，start() 直接返回该任务，
+    多个调用方共享同一次目录遍历，通过 job.follow() 读取记录或 job.wait() 等待结束。
+    iterate(job) 返回逐批产出 LoRA 记录列表的生成器，取消任务时在两批记录之间关闭该生成器。
+    """
+
+    def __init__(self, iterate):
+        self._iterate = iterate
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._running = {}
+
+    def start(self, key, refresh=False):
+        """启动扫描任务，返回 (任务, 是否新建)"""
+        with self._lock:
+            job = self._running.get(key)
+            if job is not None:
+                return job, False
+            job = ScanJob(key, refresh)
+            self._jobs[job.id] = job
+            self._running[key] = job
+            self._prune()
+        threading.Thread(target=self._run, args=(job,), name=f'scan-job-{job.id[:8]}', daemon=True).start()
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        """请求取消任务，返回任务；任务不存在时返回 None"""
+        job = self.get(job_id)
+        if job is not None and job.state == 'running':
+            job._cancel.set()
+        return job
+
+    def _prune(self):
+        # 调用方需持有 self._lock
+        finished = [job_id for job_id, job in self._jobs.items() if job.state != 'running']
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _run(self, job):
+        batches = self._iterate(job)
+        try:
+            for batch in batches:
+                with job._changed:
+                    job.records.extend(batch)
+                    job.files_parsed += len(batch)
+                    job._changed.notify_all()
+                if job.cancelled:
+                    # 关闭生成器会放弃本次扫描，已加载的库数据保持不变
+                    batches.close()
+                    raise ScanCancelled()
+            job.state = 'completed'
+        except ScanCancelled:
+            job.state = 'cancelled'
+            logger.info(f"Scan job {job.id} cancelled after {job.files_parsed} files")
+        except Exception as e:
+            job.state = 'failed'
+            job.error = str(e)
+            logger.error(f"Scan job {job.id} failed: {e}")
+        finally:
+            job._elapsed = time.perf_counter() - job._started
+            job.finished_at = time.time()
+            with self._lock:
+                if self._running.get(job.key) is job:
+                    del self._running[job.key]
+            with job._changed:
+                job._release()
+                job._changed.notify_all()
@@ -0,0 +1,183 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+
+# 各字段命中时的权重
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'activation_text': 2.0,
+    'description': 1.0,
+    'training_comment': 1.0,
+    'tags': 1.5,
+}
+
+# 模糊匹配的最低三元组相似度（Dice 系数）
+FUZZY_THRESHOLD = 0.4
+# 每个查询词最多展开的前缀 / 模糊候选词数量
+MAX_EXPANSIONS = 50
+PREFIX_SIMILARITY = 0.8
+# 搜索词相关点击量对排序的影响系数
+CLICK_BOOST = 0.5
+
+_CAMEL_RE = re.compile(r'([a-z])([A-Z])')
+_TOKEN_RE = re.compile(r'[^\W_]+')
+
+
+def tokenize(text):
+    """把文本切分为小写词，驼峰词同时保留拆分后的各部分和整体"""
+    if not text:
+        return []
+    text = str(text)
+    tokens = []
+    for word in _TOKEN_RE.findall(text):
+        lower = word.lower()
+        tokens.append(lower)
+        split = _CAMEL_RE.sub(r'\1 \2', word).lower().split()
+        if len(split) > 1:
+            tokens.extend(split)
+    return tokens
+
+
+def trigrams(token):
+    padded = f'${token}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _document_fields(record):
+    metadata = record.get('metadata') or {}
+    config = record.get('config') or {}
+    name = record.get('name', '')
+    if name.endswith('.safetensors'):
+        name = name[:-len('.safetensors')]
+    return {
+        'name': name,
+        'activation_text': config.get('activation_text', ''),
+        'description': config.get('description', ''),
+        'training_comment': metadata.get('ss_training_comment', ''),
+        # 高频训练标签和数据集目录名
+        'tags': ' '.join(metadata.get('top_tags', []) +
+                         [d.get('name', '') for d in metadata.get('dataset_dirs', [])]),
+    }
+
+
+class _Snapshot:
+    """某一版本 LoRA 库的倒排索引，构建完成后只读"""
+
+    def __init__(self, records):
+        self.records = records
+        self.postings = {}
+        self.names = []
+        for doc_id, record in enumerate(records):
+            fields = _document_fields(record)
+            weights = {}
+            for field, text in fields.items():
+                for token in set(tokenize(text)):
+                    weights[token] = weights.get(token, 0.0) + FIELD_WEIGHTS[field]
+            for token, weight in weights.items():
+                self.postings.setdefault(token, {})[doc_id] = weight
+            # 去掉分隔符的文件名，用于整词匹配加分
+            self.names.append(''.join(_TOKEN_RE.findall(fields['name'].lower())))
+
+        self.vocabulary = sorted(self.postings)
+        self.trigram_index = {}
+        self.trigram_counts = {}
+        for token in self.vocabulary:
+            grams = trigrams(token)
+            self.trigram_counts[token] = len(grams)
+            for gram in grams:
+                self.trigram_index.setdefault(gram, []).append(token)
+        total = len(records)
+        self.idf = {token: math.log(1 + total / len(docs)) for token, docs in self.postings.items()}
+
+    def expand(self, term):
+        """返回 {词: 相似度}：精确匹配、前缀匹配和三元组模糊匹配"""
+        expansions = {}
+        if term in self.postings:
+            expansions[term] = 1.0
+
+        start = bisect.bisect_left(self.vocabulary, term)
+        for token in self.vocabulary[start:start + MAX_EXPANSIONS]:
+            if not token.startswith(term):
+                break
+            if token != term:
+                expansions.setdefault(token, PREFIX_SIMILARITY)
+
+        if len(term) >= 3:
+            grams = trigrams(term)
+            shared = Counter()
+            for gram in grams:
+                shared.update(self.trigram_index.get(gram, ()))
+            for token, count in shared.most_common(MAX_EXPANSIONS):
+                similarity = 2 * count / (len(grams) + self.trigram_counts[token])
+                if similarity < FUZZY_THRESHOLD:
+                    continue
+                # 模糊匹配略低于同等相似度的前缀匹配
+                expansions[token] = max(expansions.get(token, 0.0), similarity * 0.9)
+        return expansions
+
+
+class SearchIndex:
+    """LoRA 全文 / 模糊搜索的倒排索引
+
+    索引按 LoRA 库的版本号惰性重建：库没有变化时查询只做内存查找。
+    查询词通过词表前缀和三元组索引扩展为候选词，按字段权重与 IDF 计分，
+    再结合该搜索词下的历史点击量排序。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._generation = None
+
+    def ensure(self, generation, load_records):
+        """库版本变化时重建索引，load_records 返回当前全部 LoRA 记录"""
+        if self._snapshot is not None and self._generation == generation:
+            return self._snapshot
+        with self._lock:
+            if self._snapshot is None or self._generation != generation:
+                self._snapshot = _Snapshot(load_records())
+                self._generation = generation
+            return self._snapshot
+
+    def search(self, query, limit=50, click_counts=None):
+        """返回 (按得分排序的 [(得分, 记录)], 命中总数)"""
+        snapshot = self._snapshot
+        terms = list(dict.fromkeys(tokenize(query)))
+        if snapshot is None or not terms:
+            return [], 0
+
+        scores = {}
+        matched_terms = Counter()
+        for term in terms:
+            best = {}
+            for token, similarity in snapshot.expand(term).items():
+                idf = snapshot.idf[token]
+                for doc_id, weight in snapshot.postings[token].items():
+                    score = similarity * idf * weight
+                    if score > best.get(doc_id, 0.0):
+                        best[doc_id] = score
+            for doc_id, score in best.items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + score
+                matched_terms[doc_id] += 1
+
+        click_counts = click_counts or {}
+        compact_query = ''.join(_TOKEN_RE.findall(query.lower()))
+        ranked = []
+        for doc_id, score in scores.items():
+            # 优先返回命中全部查询词的 LoRA
+            score *= matched_terms[doc_id] / len(terms)
+            name = snapshot.names[doc_id]
+            if name == compact_query:
+                score *= 2
+            elif name.startswith(compact_query):
+                score *= 1.5
+            clicks = click_counts.get(snapshot.records[doc_id].get('name'), 0)
+            if clicks:
+                score *= 1 + CLICK_BOOST * math.log1p(clicks)
+            ranked.append((score, doc_id))
+
+        top = heapq.nlargest(limit, ranked) if limit else sorted(ranked, reverse=True)
+        return [(score, snapshot.records[doc_id]) for score, doc_id in top], len(ranked)
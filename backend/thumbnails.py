@@ -0,0 +1,161 @@
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, features
+except ImportError:  # Pillow 是可选依赖，缺失时 /preview 直接返回原图
+    Image = None
+    features = None
+
+logger = logging.getLogger(__name__)
+
+# 允许的缩略图宽度，请求的宽度会向上取整到其中之一，避免缓存无限膨胀
+THUMBNAIL_WIDTHS = (128, 256, 384, 512, 768, 1024)
+
+DEFAULT_QUALITY = 80
+# Pillow 解码和缩放时释放 GIL，线程数按 CPU 核数设置（4 到 8 个），一屏卡片的缩略图可以并行生成
+DEFAULT_WORKERS = max(4, min(8, os.cpu_count() or 4))
+
+# 缓存目录的大小上限，超出后按最近使用时间删除旧的缩略图，直到降到上限的 90%
+DEFAULT_MAX_CACHE_MB = 512
+
+# 缓存命中时更新文件修改时间作为最近使用时间，同一文件在这段时间（秒）内只更新一次
+TOUCH_INTERVAL = 3600
+
+
+class ThumbnailCache:
+    """预览图缩略图的磁盘缓存
+
+    缓存文件以 (源文件路径, 大小, 修改时间, 宽度) 的哈希命名，源文件变化后
+    自动生成新的缩略图。生成工作在有限大小的线程池中执行，避免一次打开
+    大量卡片时同时解码几百张大图。缓存目录超过 max_cache_mb 时删除最久未使用的文件。
+    """
+
+    def __init__(self, cache_dir, quality=DEFAULT_QUALITY, workers=DEFAULT_WORKERS,
+                 max_cache_mb=DEFAULT_MAX_CACHE_MB):
+        self.cache_dir = cache_dir
+        self.quality = quality
+        self.max_cache_bytes = int(max_cache_mb * 1024 * 1024)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnail')
+        self._size_lock = threading.Lock()
+        # 缓存目录的总大小，第一次写入时才统计
+        self._cache_bytes = None
+        self.format = None
+        if Image is not None:
+            # 优先使用 WebP，Pillow 未编译 WebP 支持时退回 JPEG
+            self.format = 'WEBP' if features.check('webp') else 'JPEG'
+
+    @property
+    def available(self):
+        return Image is not None
+
+    @property
+    def mimetype(self):
+        return 'image/webp' if self.format == 'WEBP' else 'image/jpeg'
+
+    @staticmethod
+    def snap_width(width):
+        for size in THUMBNAIL_WIDTHS:
+            if width <= size:
+                return size
+        return THUMBNAIL_WIDTHS[-1]
+
+    def _cache_path(self, source_path, stat, width):
+        key = f"{os.path.normcase(os.path.abspath(source_path))}|{stat.st_size}|{stat.st_mtime_ns}|{width}|{self.quality}"
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        ext = 'webp' if self.format == 'WEBP' else 'jpg'
+        return os.path.join(self.cache_dir, digest[:2], f'{digest}.{ext}')
+
+    def get(self, source_path, width):
+        """返回缩略图文件路径，缓存中没有时在线程池中生成；无法生成时返回 None"""
+        if not self.available:
+            return None
+        width = self.snap_width(width)
+        stat = os.stat(source_path)
+        cache_path = self._cache_path(source_path, stat, width)
+        try:
+            cached_mtime = os.stat(cache_path).st_mtime
+        except FileNotFoundError:
+            return self._executor.submit(self._generate, source_path, cache_path, width).result()
+        if time.time() - cached_mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(cache_path)
+            except OSError:
+                pass
+        return cache_path
+
+    def _cache_files(self):
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _record_write(self, size):
+        """登记新写入的缩略图，缓存目录超出上限时删除最久未使用的文件"""
+        with self._size_lock:
+            if self._cache_bytes is None:
+                # 首次统计时新文件已经在目录中
+                self._cache_bytes = sum(file_size for _, file_size, _ in self._cache_files())
+            else:
+                self._cache_bytes += size
+            if self._cache_bytes <= self.max_cache_bytes:
+                return
+
+            files = sorted(self._cache_files())
+            total = sum(file_size for _, file_size, _ in files)
+            target = self.max_cache_bytes * 0.9
+            removed = 0
+            for _, file_size, path in files:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= file_size
+                removed += 1
+            self._cache_bytes = total
+            logger.info(f"Evicted {removed} thumbnails, cache size {total / 1024 / 1024:.1f} MB")
+
+    def _generate(self, source_path, cache_path, width):
+        # 等待期间可能已被其他请求生成
+        if os.path.exists(cache_path):
+            return cache_path
+        try:
+            with Image.open(source_path) as img:
+                if img.width <= width:
+                    # 原图已经足够小，不需要缩放
+                    return None
+                img.draft('RGB', (width, width * 4))
+                img.thumbnail((width, img.height * width // img.width + 1), Image.LANCZOS)
+                if self.format == 'JPEG' or img.mode not in ('RGB', 'RGBA'):
+                    img = img.convert('RGBA' if self.format == 'WEBP' and 'A' in img.getbands() else 'RGB')
+                buffer = io.BytesIO()
+                img.save(buffer, self.format, quality=self.quality)
+
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(cache_path))
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(buffer.getvalue())
+                os.replace(temp_path, cache_path)
+            except Exception:
+                os.remove(temp_path)
+                raise
+            self._record_write(len(buffer.getvalue()))
+            return cache_path
+        except Exception as e:
+            logger.error(f"Error generating thumbnail for {source_path}: {e}")
+            return None
@@ -0,0 +1,246 @@
+import json
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli 是可选依赖，缺失时只提供 gzip 压缩
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack 是可选依赖，缺失时 format=msgpack 返回 400
+    msgpack = None
+
+from lora_query import QueryError, get_list, parse_bool
+
+# LoRA 记录的全部顶层字段，也是 columns 布局的默认列顺序
+RECORD_FIELDS = ('name', 'base_name', 'relative_path', 'has_preview', 'has_config', 'preview_path',
+                 'metadata', 'config', 'global_clicks', 'search_clicks')
+
+FORMAT_PARAMS = ('fields', 'compact', 'layout', 'format')
+
+LAYOUTS = ('rows', 'columns')
+
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+
+# 只压缩这些类型的响应；图片已经是压缩格式，SSE 需要逐条实时送达
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', MSGPACK_MIMETYPE}
+
+# 小于该大小的响应不压缩
+MIN_COMPRESS_SIZE = 1024
+
+# 压缩级别：数 MB 的列表在这两个级别下压缩率已接近上限，耗时远低于最高级别
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _parse_fields(fields):
+    """把 fields 参数解析为 {顶层字段: None 或 [子字段]}，支持 metadata.base_model 这样的一级嵌套"""
+    tree = {}
+    unknown = []
+    for field in fields:
+        top, _, sub = field.partition('.')
+        if top not in RECORD_FIELDS:
+            unknown.append(field)
+        elif not sub:
+            tree[top] = None
+        elif top not in tree or tree[top] is not None:
+            tree.setdefault(top, [])
+            if sub not in tree[top]:
+                tree[top].append(sub)
+    if unknown:
+        raise QueryError(f'Unknown fields: {", ".join(unknown)}')
+    return tree
+
+
+def strip_defaults(value):
+    """递归去掉对象中值为 null、false、空字符串、空列表或空对象的字段，数字 0 保留"""
+    if isinstance(value, dict):
+        stripped = {}
+        for key, item in value.items():
+            if isinstance(item, (dict, list)):
+                item = strip_defaults(item)
+                if not item:
+                    continue
+            elif item is None or item is False or item == '':
+                continue
+            stripped[key] = item
+        return stripped
+    if isinstance(value, list):
+        # 列表元素的位置有意义，只处理其中的对象和列表
+        return [strip_defaults(item) if isinstance(item, (dict, list)) else item for item in value]
+    return value
+
+
+class WireFormat:
+    """LoRA 列表接口的输出格式
+
+    fields 只返回指定的字段（metadata.base_model 表示 metadata 中只保留 base_model）；
+    compact 省略默认值（客户端把缺失的字段视为 null / false / 空值）；
+    layout=columns 把记录列表改为 {"columns": [...], "rows": [[...]]}，
+    字段名只出现一次；format=msgpack 使用 MessagePack 编码。
+    """
+
+    def __init__(self, fields=None, compact=False, layout='rows', encoding='json'):
+        self.fields = fields
+        self.compact = compact
+        self.layout = layout
+        self.encoding = encoding
+
+    @classmethod
+    def from_args(cls, args):
+        """从请求参数解析输出格式，没有任何相关参数时返回 None 以保持原有的 JSON 格式"""
+        if not any(name in args for name in FORMAT_PARAMS):
+            return None
+
+        fields = get_list(args, 'fields')
+        fields = _parse_fields(fields) if fields else None
+
+        compact = parse_bool(args['compact']) if args.get('compact') else False
+
+        layout = args.get('layout') or 'rows'
+        if layout not in LAYOUTS:
+            raise QueryError(f'Invalid layout: {layout}')
+
+        encoding = args.get('format') or 'json'
+        if encoding not in ('json', 'msgpack'):
+            raise QueryError(f'Invalid format: {encoding}')
+        if encoding == 'msgpack' and msgpack is None:
+            raise QueryError('MessagePack is not available on this server')
+
+        return cls(fields, compact, layout, encoding)
+
+    @property
+    def columns(self):
+        return tuple(self.fields) if self.fields else RECORD_FIELDS
+
+    @property
+    def mimetype(self):
+        return MSGPACK_MIMETYPE if self.encoding == 'msgpack' else 'application/json'
+
+    @property
+    def stream_mimetype(self):
+        return MSGPACK_MIMETYPE if self.encoding == 'msgpack' else 'application/x-ndjson'
+
+    def _value(self, record, field):
+        value = record.get(field)
+        sub_fields = self.fields.get(field) if self.fields else None
+        if sub_fields is not None and isinstance(value, dict):
+            value = {key: value[key] for key in sub_fields if key in value}
+        return value
+
+    def record(self, record):
+        """按 rows 布局转换一条记录"""
+        if self.fields:
+            record = {field: self._value(record, field) for field in self.fields if field in record}
+        return strip_defaults(record) if self.compact else record
+
+    def row(self, record):
+        """按 columns 布局把一条记录转换为与 columns 顺序一致的数组"""
+        values = [self._value(record, field) for field in self.columns]
+        return [strip_defaults(value) for value in values] if self.compact else values
+
+    def records(self, records):
+        """转换记录列表，columns 布局返回 {"columns": [...], "rows": [[...]]}"""
+        if self.layout == 'columns':
+            return {'columns': list(self.columns), 'rows': [self.row(record) for record in records]}
+        return [self.record(record) for record in records]
+
+    def stream_header(self):
+        """流式响应的第一项：columns 布局先输出列名，之后每项为一行数组"""
+        return {'columns': list(self.columns)} if self.layout == 'columns' else None
+
+    def stream_record(self, record):
+        return self.row(record) if self.layout == 'columns' else self.record(record)
+
+    def dumps(self, value):
+        """编码一个完整的响应体"""
+        if self.encoding == 'msgpack':
+            return msgpack.packb(value, use_bin_type=True)
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def dumps_item(self, value):
+        """编码流式响应中的一项：JSON 为一行文本，MessagePack 为首尾相接的多个对象"""
+        if self.encoding == 'msgpack':
+            return msgpack.packb(value, use_bin_type=True)
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def choose_encoding(accept_encodings):
+    """根据 Accept-Encoding 选择压缩算法，返回 'br'、'gzip' 或 None"""
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return accept_encodings.best_match(offered)
+
+
+class _Compressor:
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._obj = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            # wbits=31 输出带 gzip 头的数据
+            self._obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._obj.process(data)
+        return self._obj.compress(data)
+
+    def flush(self):
+        if self.encoding == 'br':
+            return self._obj.flush()
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._obj.finish()
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+def compress_body(data, encoding):
+    compressor = _Compressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+
+def compress_stream(chunks, encoding):
+    """逐块压缩流式响应，每块之后刷新压缩输出，客户端收到即可解压
+
+    每次刷新都会损失一点压缩率，调用方应按批次而不是逐条记录产出数据块。
+    """
+    compressor = _Compressor(encoding)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield compressor.compress(chunk) + compressor.flush()
+        yield compressor.finish()
+    finally:
+        # 客户端断开时关闭原始生成器，让其中的清理代码得以执行
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def compress_response(response, accept_encodings):
+    """按 Accept-Encoding 压缩 JSON / NDJSON / MessagePack 响应，返回使用的压缩算法"""
+    if (response.mimetype not in COMPRESSIBLE_MIMETYPES or response.direct_passthrough
+            or not 200 <= response.status_code < 300 or response.status_code == 204
+            or 'Content-Encoding' in response.headers):
+        return None
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return None
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return None
+        response.set_data(compress_body(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return encoding